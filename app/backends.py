@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import torch
+from app.metrics import stage
+
+# INFERENCE_BACKEND value -> ONNX file produced by the scripts in onnx/
+ONNX_MODELS = {
+    "onnx-fp32": "tumor_resnet.onnx",
+    "onnx-fp16": "tumor_resnet_fp16.onnx",
+    "onnx-int8": "tumor_resnet_int8.onnx",
+}
+BACKENDS = ("torch", *ONNX_MODELS)
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+class TorchBackend:
+    """Eager PyTorch: logits and Grad-CAM++ maps from one fused forward+backward.
+
+    With `split` (see app.model_loader.explain_split), classify_lazy() keeps only
+    the input of the block holding the target layer, and explain() recomputes
+    just that block with gradients.
+
+    Every method takes an optional `timings` dict that accumulates seconds per
+    stage ("forward", "backward", "cam").
+    """
+
+    def __init__(self, grad_cam_pp, split=None):
+        self.name = "torch"
+        self.grad_cam_pp = grad_cam_pp
+        self.split = split
+
+    def classify(self, input_batch, timings=None):
+        """(N, classes) logits as a numpy array, without gradients or CAMs."""
+        with stage(timings, "forward"), torch.no_grad():
+            return self.grad_cam_pp.model(input_batch).cpu().numpy()
+
+    def infer(self, input_batch, timings=None):
+        """(logits (N, classes), cams (N, H, W), class indices) for a preprocessed batch."""
+        logits, cams, indices = self.grad_cam_pp.forward_backward_batch(input_batch, timings=timings)
+        return logits.cpu().numpy(), cams, indices
+
+    def classify_lazy(self, input_batch, timings=None):
+        """(logits, state): `state[i]` is what explain() needs for image i later."""
+        if self.split is None:
+            return self.classify(input_batch, timings), input_batch
+        logits, block_input = self.grad_cam_pp.capture_block_input(input_batch, self.split[0], timings)
+        return logits.cpu().numpy(), block_input
+
+    def explain(self, states, class_indices, timings=None):
+        """(N, H, W) Grad-CAM++ maps from stacked classify_lazy() states."""
+        if self.split is None:
+            return self.grad_cam_pp.forward_backward_batch(states, class_indices, timings)[1]
+        return self.grad_cam_pp.explain_from(states, self.split[1], class_indices, timings)[1]
+
+    def close(self):
+        self.grad_cam_pp.detach()
+
+
+class OnnxBackend:
+    """ONNX Runtime classification; Grad-CAM++ still runs on the PyTorch model.
+
+    ONNX graphs carry no autograd, so explanations come from `grad_cam_pp`, seeded
+    with the classes ONNX Runtime predicted so the heatmap explains the returned
+    label. `classify()` is ONNX Runtime only.
+    """
+
+    def __init__(self, name, model_path, grad_cam_pp, intra_op_threads=0,
+                 inter_op_threads=0, graph_optimization="all"):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError(f"INFERENCE_BACKEND={name} requires the onnxruntime package") from e
+        if graph_optimization not in _GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(
+                f"Unknown graph optimization level {graph_optimization!r}; "
+                f"expected one of {list(_GRAPH_OPTIMIZATION_LEVELS)}"
+            )
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX model for {name} not found at {model_path}; export it with the scripts in onnx/")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = getattr(
+            ort.GraphOptimizationLevel, _GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+        )
+        self.name = name
+        self.model_path = model_path
+        self.grad_cam_pp = grad_cam_pp
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def classify(self, input_batch, timings=None):
+        # fp16/int8 models are converted with float32 I/O, so every variant takes float32
+        with stage(timings, "onnx_forward"):
+            inputs = input_batch.detach().cpu().numpy().astype(np.float32, copy=False)
+            return self.session.run(None, {self._input_name: inputs})[0]
+
+    def infer(self, input_batch, timings=None):
+        logits = self.classify(input_batch, timings)
+        indices = logits.argmax(axis=1).tolist()
+        _, cams, _ = self.grad_cam_pp.forward_backward_batch(input_batch, indices, timings)
+        return logits, cams, indices
+
+    def classify_lazy(self, input_batch, timings=None):
+        # the explanation needs a PyTorch forward anyway, so keep the model input
+        return self.classify(input_batch, timings), input_batch
+
+    def explain(self, states, class_indices, timings=None):
+        return self.grad_cam_pp.forward_backward_batch(states, class_indices, timings)[1]
+
+    def close(self):
+        self.grad_cam_pp.detach()
+
+
+def create_backend(name, grad_cam_pp, num_threads=None, split=None):
+    """Backend selected by `name` (see BACKENDS), configured by ONNX_MODEL_DIR and ORT_* variables.
+
+    `num_threads` is the default ONNX Runtime intra-op thread count (0 = all cores)
+    when ORT_INTRA_OP_THREADS is not set. `split` enables cheap lazy explanations
+    on the torch backend.
+    """
+    if name == "torch":
+        return TorchBackend(grad_cam_pp, split)
+    if name not in ONNX_MODELS:
+        raise ValueError(f"Unknown inference backend {name!r}; expected one of {list(BACKENDS)}")
+    return OnnxBackend(
+        name,
+        os.path.join(os.getenv("ONNX_MODEL_DIR", "onnx"), ONNX_MODELS[name]),
+        grad_cam_pp,
+        intra_op_threads=int(os.getenv("ORT_INTRA_OP_THREADS", num_threads or 0)),
+        inter_op_threads=int(os.getenv("ORT_INTER_OP_THREADS", "0")),
+        graph_optimization=os.getenv("ORT_GRAPH_OPTIMIZATION", "all").lower(),
+    )
+
+
+def backend_from_env(grad_cam_pp, num_threads=None, split=None):
+    return create_backend(os.getenv("INFERENCE_BACKEND", "torch").lower(), grad_cam_pp, num_threads, split)
@@ -0,0 +1,174 @@
+import asyncio
+import time
+from collections import deque
+import numpy as np
+
+
+class QueueFullError(Exception):
+    """Raised by MicroBatcher.submit() when the request queue is at capacity."""
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches for a synchronous batch handler.
+
+    A batch is dispatched as soon as it holds `max_batch_size` items or the first
+    item has waited `max_wait_ms`. `handler(items)` runs in `executor` (the loop's
+    default executor if None) and must return one entry per item; entries that are
+    exceptions are raised to the matching caller only.
+
+    At most `max_concurrency` batches run at once; while they do, new requests keep
+    queueing (and form larger batches). `submit()` raises QueueFullError once
+    `max_queue` requests are waiting, so callers can shed load instead of piling up.
+    """
+
+    def __init__(self, handler, max_batch_size=8, max_wait_ms=10, executor=None,
+                 max_concurrency=1, max_queue=None, stats_window=1000):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._queue = None
+        self._task = None
+        self._slots = None
+        self._dispatches = set()
+
+        self._in_flight = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._batches = 0
+        self._wait_ms = deque(maxlen=stats_window)
+        self._batch_sizes = deque(maxlen=stats_window)
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        for task in [self._task, *self._dispatches]:
+            task.cancel()
+        await asyncio.gather(self._task, *self._dispatches, return_exceptions=True)
+        self._task = None
+        # fail anything still waiting so callers do not hang
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("inference queue shut down"))
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def full(self):
+        """True while `submit()` would raise QueueFullError."""
+        return self.max_queue is not None and self.queue_depth >= self.max_queue
+
+    def stats(self):
+        wait_ms = np.array(self._wait_ms) if self._wait_ms else np.zeros(1)
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "batches_in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "requests_submitted": self._submitted,
+            "requests_rejected": self._rejected,
+            "batches_dispatched": self._batches,
+            "mean_batch_size": float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0,
+            "queue_wait_ms": {
+                "p50": float(np.percentile(wait_ms, 50)),
+                "p99": float(np.percentile(wait_ms, 99)),
+                "max": float(wait_ms.max()),
+            },
+        }
+
+    async def submit(self, item):
+        if self._task is None:
+            raise RuntimeError("MicroBatcher is not running; call start() first")
+        if self.full:
+            self._rejected += 1
+            raise QueueFullError(f"inference queue is full ({self.max_queue} waiting)")
+        self._submitted += 1
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # wait for a free worker first, so requests keep queueing (and batch
+            # up) while every worker is busy
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+
+            now = time.perf_counter()
+            live = []
+            for item, future, queued_at in batch:
+                self._wait_ms.append((now - queued_at) * 1000)
+                # callers that gave up while queued are dropped from the batch
+                if not future.done():
+                    live.append((item, future))
+            if not live:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._dispatch(live))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        self._batches += 1
+        self._batch_sizes.append(len(batch))
+        try:
+            results = await loop.run_in_executor(
+                self.executor, self.handler, [item for item, _ in batch]
+            )
+        except asyncio.CancelledError:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("inference queue shut down"))
+            raise
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
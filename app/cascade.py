@@ -0,0 +1,62 @@
+import os
+import torch
+from app.backends import ONNX_MODELS, create_backend
+from app.inference import CLASS_NAMES
+from app.model_loader import load_weights
+from app.model_registry import PREPROCESSING, SPECS
+
+CASCADE_SCREENS = tuple(sorted([*(n for n, s in SPECS.items() if s.task == "detection"), *ONNX_MODELS]))
+
+_NOTUMOR = CLASS_NAMES.index("notumor")
+
+
+class ModelScreen:
+    """Binary detector from classification_binary (SimpleCNN or the binary ResNet18)."""
+
+    def __init__(self, name, weights_path, device, threshold=0.5):
+        spec = SPECS[name]
+        self.name = name
+        self.threshold = threshold
+        self.device = device
+        self._preprocessing = spec.preprocessing
+        self.model = load_weights(spec.build, weights_path)
+        self.model.to(device)
+        self.model.eval()
+
+    def tumor_probability(self, images, input_batch):
+        """P(tumor) for decoded PIL images; `input_batch` is their ResNet input tensor."""
+        if self._preprocessing != "imagenet_224":
+            preprocess = PREPROCESSING[self._preprocessing]
+            input_batch = torch.stack([preprocess(image) for image in images]).to(self.device)
+        with torch.no_grad():
+            return torch.sigmoid(self.model(input_batch)[:, 0]).float().cpu().numpy()
+
+
+class BackendScreen:
+    """4-class ONNX Runtime model (e.g. INT8): P(tumor) = 1 - P(notumor)."""
+
+    def __init__(self, backend, threshold=0.5):
+        self.name = backend.name
+        self.threshold = threshold
+        self.backend = backend
+
+    def tumor_probability(self, images, input_batch):
+        logits = torch.from_numpy(self.backend.classify(input_batch)).float()
+        return 1 - torch.softmax(logits, dim=1)[:, _NOTUMOR].numpy()
+
+
+def screen_from_env(device, grad_cam_pp, num_threads=None):
+    """Screen selected by CASCADE_SCREEN, or None when cascading is off."""
+    name = os.getenv("CASCADE_SCREEN", "").lower()
+    if not name:
+        return None
+    if name not in CASCADE_SCREENS:
+        raise ValueError(f"Unknown cascade screen {name!r}; expected one of {list(CASCADE_SCREENS)}")
+    threshold = float(os.getenv("CASCADE_THRESHOLD", "0.5"))
+    if name in ONNX_MODELS:
+        return BackendScreen(create_backend(name, grad_cam_pp, num_threads), threshold)
+    weights_path = os.getenv("CASCADE_SCREEN_WEIGHTS")
+    if not weights_path:
+        raise ValueError(f"CASCADE_SCREEN={name} needs CASCADE_SCREEN_WEIGHTS")
+    return ModelScreen(name, weights_path, device, threshold)
+
@@ -0,0 +1,149 @@
+import os
+import time
+import uuid
+import base64
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from PIL import Image
+from app.metrics import stage
+
+FORMATS = {
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+DELIVERIES = ("base64", "url", "multipart")
+
+
+@dataclass(frozen=True)
+class EncodingOptions:
+    """How predict visualizations are encoded and delivered.
+
+    format:             "png" (lossless), "webp" or "jpeg" (lossy, use `quality`)
+    quality:            1-100 for webp/jpeg
+    png_compress_level: 0 (fastest, largest) - 9 (slowest, smallest)
+    max_side:           downscale previews so the longest side is at most this (None = full size)
+    delivery:           "base64" (inline JSON), "url" (fetch from /visualizations) or "multipart"
+    """
+    format: str = "png"
+    quality: int = 85
+    png_compress_level: int = 6
+    max_side: int = None
+    delivery: str = "base64"
+
+    def __post_init__(self):
+        if self.format not in FORMATS:
+            raise ValueError(f"Unsupported visualization format {self.format!r}; expected one of {sorted(FORMATS)}")
+        if self.delivery not in DELIVERIES:
+            raise ValueError(f"Unsupported visualization delivery {self.delivery!r}; expected one of {list(DELIVERIES)}")
+        if not 1 <= self.quality <= 100:
+            raise ValueError("quality must be between 1 and 100")
+        if not 0 <= self.png_compress_level <= 9:
+            raise ValueError("png_compress_level must be between 0 and 9")
+        if self.max_side is not None and self.max_side < 1:
+            raise ValueError("max_side must be a positive number of pixels")
+
+    @property
+    def media_type(self):
+        return FORMATS[self.format][1]
+
+    @property
+    def cache_tag(self):
+        """Distinguishes cached results encoded with different options."""
+        return f"{self.format}:{self.quality}:{self.png_compress_level}:{self.max_side}:{self.delivery == 'base64'}"
+
+    def with_overrides(self, **overrides):
+        return replace(self, **{k: v for k, v in overrides.items() if v is not None})
+
+
+def encoding_options_from_env():
+    max_side = os.getenv("VIS_MAX_SIDE")
+    return EncodingOptions(
+        format=os.getenv("VIS_FORMAT", "png").lower(),
+        quality=int(os.getenv("VIS_QUALITY", "85")),
+        png_compress_level=int(os.getenv("VIS_PNG_COMPRESS_LEVEL", "6")),
+        max_side=int(max_side) if max_side else None,
+        delivery=os.getenv("VIS_DELIVERY", "base64").lower(),
+    )
+
+
+def encode_image(arr, options):
+    """Encode an (H,W,3) uint8 array to bytes in the configured format."""
+    image = Image.fromarray(arr)
+    if options.max_side and max(image.size) > options.max_side:
+        image.thumbnail((options.max_side, options.max_side), Image.BILINEAR)
+
+    pil_format = FORMATS[options.format][0]
+    buf = BytesIO()
+    if pil_format == "PNG":
+        image.save(buf, format="PNG", compress_level=options.png_compress_level)
+    else:
+        image.save(buf, format=pil_format, quality=options.quality)
+    return buf.getvalue()
+
+
+def encode_visualizations(arrays, options, timings=None):
+    """Encode named arrays; base64 strings for inline delivery, raw bytes otherwise.
+
+    If given, `timings` accumulates seconds spent in "encode" and "base64".
+    """
+    with stage(timings, "encode"):
+        encoded = {name: encode_image(arr, options) for name, arr in arrays.items()}
+    if options.delivery == "base64":
+        with stage(timings, "base64"):
+            return {name: base64.b64encode(data).decode("utf-8") for name, data in encoded.items()}
+    return encoded
+
+
+class VisualizationStore:
+    """Short-lived in-memory store backing the "url" delivery mode."""
+
+    def __init__(self, max_entries=256, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # id -> (stored_at, media_type, {name: bytes})
+        self._lock = threading.Lock()
+
+    def put(self, images, media_type):
+        vis_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[vis_id] = (time.time(), media_type, images)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return vis_id
+
+    def get(self, vis_id, name):
+        """(bytes, media_type) or None if unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(vis_id)
+            if entry is None:
+                return None
+            stored_at, media_type, images = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[vis_id]
+                return None
+        data = images.get(name)
+        return (data, media_type) if data is not None else None
+
+
+def multipart_body(result_json, images, media_type):
+    """multipart/form-data body: a "result" JSON part followed by one part per image.
+
+    Returns (body bytes, content type). Browsers can read it with `response.formData()`.
+    """
+    boundary = uuid.uuid4().hex
+    extension = media_type.split("/")[1]
+    parts = [
+        ('Content-Disposition: form-data; name="result"\r\n'
+         "Content-Type: application/json\r\n\r\n").encode() + result_json
+    ]
+    for name, data in images.items():
+        parts.append(
+            (f'Content-Disposition: form-data; name="{name}"; filename="{name}.{extension}"\r\n'
+             f"Content-Type: {media_type}\r\n\r\n").encode() + data
+        )
+    delimiter = f"--{boundary}\r\n".encode()
+    body = b"".join(delimiter + part + b"\r\n" for part in parts) + f"--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
@@ -0,0 +1,51 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+
+class ExplanationStore:
+    """Keeps what a lazily classified request needs for a later /explain call:
+    the upload, the captured activations, the predicted class and its encoding.
+
+    Bounded by entry count, total upload bytes and TTL; the oldest entries go first.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=256 * 1024 * 1024, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # id -> (stored_at, size, entry)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, image, explanation, encoding):
+        """Store one request's explanation state; returns its id."""
+        explanation_id = uuid.uuid4().hex
+        state = explanation.get("state")  # None for results served from the ResultCache
+        size = len(image) + (state.numel() * state.element_size() if state is not None else 0)
+        entry = (image, state, explanation["class_index"], encoding)
+        with self._lock:
+            self._entries[explanation_id] = (time.time(), size, entry)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, oldest_size, _) = self._entries.popitem(last=False)
+                self._bytes -= oldest_size
+        return explanation_id
+
+    def get(self, explanation_id):
+        """(image, state, class index, encoding) or None if unknown or expired."""
+        with self._lock:
+            item = self._entries.get(explanation_id)
+            if item is None:
+                return None
+            stored_at, size, entry = item
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[explanation_id]
+                self._bytes -= size
+                return None
+            return entry
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
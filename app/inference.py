@@ -2,44 +2,247 @@ import torch
 import numpy as np
 from torchvision import transforms
 from PIL import Image
-from gradcam_pp import run_gradcam
-import base64
+from gradcam_pp import cam_regions, render_cams
+from app.encoding import EncodingOptions, encode_visualizations
+from app.metrics import stage
 from io import BytesIO
 
 CLASS_NAMES = ["glioma", "meningioma", "notumor", "pituitary"]
 
-def predict(model, device, image_path, target_layer):
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225]
-        )
-    ])
+transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(
+        mean=[0.485, 0.456, 0.406],
+        std=[0.229, 0.224, 0.225]
+    )
+])
 
-    image = Image.open(image_path).convert("RGB")
-    image = transform(image).unsqueeze(0).to(device)
 
-    with torch.no_grad():
-        logits = model(image)
-        probs = torch.softmax(logits, dim=1).cpu().numpy()[0]
+DEFAULT_ENCODING = EncodingOptions()
 
+
+def decode_image(source):
+    """Decode an upload (raw bytes) or an image path into an RGB PIL image."""
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    return Image.open(source).convert("RGB")
+
+
+def predict(backend, device, image, cache=None, encoding=None, screen=None, explain=True):
+    result = predict_batch(backend, device, [image], cache, [encoding], screen, [explain])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def predict_batch(backend, device, images, cache=None, encodings=None, screen=None, explain=None,
+                  timings=None):
+    """Run N images (upload bytes or paths) through one batched inference on
+    `backend` (app.backends).
+
+    Each image is decoded exactly once; the decoded pixels feed the model input,
+    the overlays and the "original" visualization. With a ResultCache, images
+    already seen (or repeated within the batch) skip the model entirely. Returns
+    one entry per input: the result dict, or the exception raised while decoding
+    that image, so one bad upload does not fail the whole batch.
+
+    `encodings` optionally gives per-image EncodingOptions (None = PNG/base64).
+
+    With a cascade `screen` (app.cascade), the batch first goes through the cheap
+    screening model; only scans whose tumor probability reaches `screen.threshold`
+    pay for the multi-class forward and the Grad-CAM++ backward.
+
+    `explain` optionally gives per-image flags (default: all True). Unexplained
+    images are only classified, without autograd; their result carries an
+    "explanation" state that explain_batch() turns into heatmap and bounding box
+    later.
+
+    If given, `timings` accumulates the seconds the batch spent in each stage
+    (decode, cache, transform, screen, forward, backward, cam, overlay, encode,
+    base64).
+    """
+    encodings = [e or DEFAULT_ENCODING for e in (encodings or [None] * len(images))]
+    explain = explain or [True] * len(images)
+    results = [None] * len(images)
+    pending = {}  # cache key (or position) -> positions waiting for that result
+    decoded, originals, tensors, keys, options, explains = [], [], [], [], [], []
+
+    # decode + preprocess once, shared by classification and Grad-CAM++
+    for i, image in enumerate(images):
+        try:
+            with stage(timings, "decode"):
+                img_pil = decode_image(image)
+        except Exception as e:
+            results[i] = e
+            continue
+
+        variant = encodings[i].cache_tag + ("" if explain[i] else ":lazy")
+        with stage(timings, "cache"):
+            key = cache.key(img_pil, variant) if cache is not None else i
+            if key in pending:
+                pending[key].append(i)
+                continue
+            cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            results[i] = cached
+            continue
+
+        pending[key] = [i]
+        decoded.append(img_pil)
+        with stage(timings, "transform"):
+            originals.append(np.array(img_pil))
+            tensors.append(transform(img_pil))
+        keys.append(key)
+        options.append(encodings[i])
+        explains.append(explain[i])
+
+    if not tensors:
+        return results
+
+    with stage(timings, "transform"):
+        input_batch = torch.stack(tensors).to(device)
+    escalate = list(range(len(tensors)))
+    if screen is not None:
+        with stage(timings, "screen"):
+            tumor_probs = screen.tumor_probability(decoded, input_batch)
+        escalate = [j for j, p in enumerate(tumor_probs) if p >= screen.threshold]
+        for j, p in enumerate(tumor_probs):
+            if p < screen.threshold:
+                _finish(cache, keys[j], pending, results,
+                        _screened_out_result(originals[j], p, screen, options[j], timings), timings)
+
+    full = [j for j in escalate if explains[j]]
+    lazy = [j for j in escalate if not explains[j]]
+
+    # logits and Grad-CAM++ maps for the images that want them now
+    if full:
+        logits, cams, _ = backend.infer(input_batch[full], timings)
+        probs_batch = torch.softmax(torch.from_numpy(logits).float(), dim=1).numpy()
+        with stage(timings, "regions"):
+            regions = [cam_regions(cam, originals[j].shape[:2]) for j, cam in zip(full, cams)]
+        with stage(timings, "overlay"):
+            rendered = render_cams([originals[j] for j in full], cams, regions=regions)
+        for j, explanation, image_regions, probs in zip(full, rendered, regions, probs_batch):
+            result = _build_result(originals[j], explanation, probs, options[j], timings)
+            result["regions"] = image_regions
+            if screen is not None:
+                result["cascade"] = _cascade_info(tumor_probs[j], screen, escalated=True)
+            _finish(cache, keys[j], pending, results, result, timings)
+
+    # classification only; keep what explain_batch() needs to finish the job
+    if lazy:
+        logits, states = backend.classify_lazy(input_batch[lazy], timings)
+        probs_batch = torch.softmax(torch.from_numpy(logits).float(), dim=1).numpy()
+        states = states.detach().cpu()
+        for j, state, probs in zip(lazy, states, probs_batch):
+            result = _build_result(originals[j], None, probs, options[j], timings)
+            result["explanation"] = {"state": state.clone(), "class_index": int(probs.argmax())}
+            if screen is not None:
+                result["cascade"] = _cascade_info(tumor_probs[j], screen, escalated=True)
+            _finish(cache, keys[j], pending, results, result, timings)
+
+    return results
+
+
+def explain_batch(backend, device, items, timings=None):
+    """Heatmap and bounding box for lazily classified uploads.
+
+    items: (upload bytes, explanation state, class index, EncodingOptions or None)
+    from a predict_batch() result. A state of None (results served from the
+    ResultCache) is recaptured with a no-grad classify_lazy() forward first.
+    Returns one entry per item:
+    {"visualizations": encoded images, "regions": cam_regions() boxes}, or the
+    exception raised for it. `timings` as in predict_batch().
+    """
+    results = [None] * len(items)
+    originals, states, indices, positions, missing = [], [], [], [], []
+    for i, (image, state, class_index, _) in enumerate(items):
+        try:
+            with stage(timings, "decode"):
+                img_pil = decode_image(image)
+                originals.append(np.array(img_pil))
+        except Exception as e:
+            results[i] = e
+            continue
+        if state is None:
+            with stage(timings, "transform"):
+                state = transform(img_pil)
+            missing.append(len(states))
+        states.append(state)
+        indices.append(class_index)
+        positions.append(i)
+    if not positions:
+        return results
+
+    if missing:
+        with stage(timings, "transform"):
+            inputs = torch.stack([states[k] for k in missing]).to(device)
+        _, captured = backend.classify_lazy(inputs, timings)
+        for k, state in zip(missing, captured.detach().cpu()):
+            states[k] = state
+
+    cams = backend.explain(torch.stack(states).to(device), indices, timings)
+    with stage(timings, "regions"):
+        regions = [cam_regions(cam, original.shape[:2]) for original, cam in zip(originals, cams)]
+    with stage(timings, "overlay"):
+        rendered = render_cams(originals, cams, regions=regions)
+    for i, images, image_regions in zip(positions, rendered, regions):
+        results[i] = {
+            "visualizations": encode_visualizations(images, items[i][3] or DEFAULT_ENCODING, timings),
+            "regions": image_regions,
+        }
+    return results
+
+
+def _finish(cache, key, pending, results, result, timings=None):
+    if cache is not None:
+        with stage(timings, "cache"):
+            cache.put(key, _cacheable(result))
+    for i in pending[key]:
+        results[i] = result
+
+
+def _cacheable(result):
+    # The explanation state is per request: the caller hands it to the
+    # ExplanationStore. Cached copies keep only the class, so a cache hit
+    # carries an explanation without a state and explain_batch() recaptures it.
+    if "explanation" not in result:
+        return result
+    return {**result, "explanation": {"class_index": result["explanation"]["class_index"]}}
+
+
+def _cascade_info(tumor_probability, screen, escalated):
+    return {
+        "screen": screen.name,
+        "tumor_probability": float(tumor_probability),
+        "threshold": screen.threshold,
+        "escalated": escalated,
+    }
+
+
+def _screened_out_result(original_img, tumor_probability, screen, encoding, timings=None):
+    # cleared by the screen: no 4-class probabilities and no heatmap, since the
+    # multi-class model never ran
+    confidence = float(1 - tumor_probability)
+    return {
+        "prediction": "notumor",
+        "confidence": confidence,
+        "all_probabilities": {"notumor": confidence},
+        "visualizations": encode_visualizations({"original": original_img}, encoding, timings),
+        "visualization_format": encoding.media_type,
+        "cascade": _cascade_info(tumor_probability, screen, escalated=False),
+    }
+
+
+def _build_result(original_img, explanation, probs, encoding, timings=None):
+    """Result dict; `explanation` is the render_cams() output for the image
+    (heatmap and bounding box), or None to visualize only the original."""
     pred_index = probs.argmax()
     pred_class = CLASS_NAMES[pred_index]
     confidence = float(probs[pred_index])
 
-    heatmap, bbox = run_gradcam(model, device, image_path, target_layer)
-
-    def _encode_png(arr):
-        buf = BytesIO()
-        Image.fromarray(arr).save(buf, format="PNG")
-        return base64.b64encode(buf.getvalue()).decode("utf-8")
-
-    heatmap_b64 = _encode_png(heatmap)
-    bbox_b64 = _encode_png(bbox)
-    original_img = np.array(Image.open(image_path).convert("RGB"))
-    original_b64 = _encode_png(original_img)
+    images = {"original": original_img, **(explanation or {})}
 
     return {
         "prediction": pred_class,
@@ -47,9 +250,6 @@ def predict(model, device, image_path, target_layer):
         "all_probabilities": {
             CLASS_NAMES[i]: float(probs[i]) for i in range(len(CLASS_NAMES))
         },
-        "visualizations": {
-            "original": original_b64,
-            "heatmap": heatmap_b64,
-            "bounding_box": bbox_b64
-        }
+        "visualizations": encode_visualizations(images, encoding, timings),
+        "visualization_format": encoding.media_type
     }
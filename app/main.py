@@ -1,13 +1,29 @@
 # uvicorn app.main:app --reload
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from app.model_loader import load_model
-from app.inference import predict
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Match
+from PIL import UnidentifiedImageError
+from app.model_loader import explain_split, load_model, warmup
+from app.backends import backend_from_env
+from app.cascade import screen_from_env
+from app.batching import MicroBatcher, QueueFullError
+from app.worker_pool import cache_version, create_executor, prestart_workers, run_batch, run_explain, run_models
+from app.explanations import ExplanationStore
+from app.model_registry import TASKS, model_memory, process_memory, registry_from_env
+from app.result_cache import result_cache_from_env
+from app.encoding import encoding_options_from_env, VisualizationStore, multipart_body
+from app.metrics import MetricsRegistry
 import os
+import json
+import time
+import asyncio
+import zipfile
+from io import BytesIO
+from typing import List
 from datetime import datetime
 import traceback
-from gradcam_pp import run_gradcam
+from gradcam_pp import GradCAMPP
 
 app = FastAPI(title="Brain Tumor Detection API (ResNet18 Multi-Class Classifier)")
 
@@ -32,58 +48,348 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-model, device, target_layer = load_model()
+# cold start: fetch/verify weights, build the model, warm it up; every phase is
+# timed and reported on /health
+_startup_begin = time.perf_counter()
+startup_timings = {}
+model, device, target_layer = load_model(startup_timings)
+
+# one Grad-CAM++ engine per process; hooks stay attached until shutdown.
+# INFERENCE_BACKEND picks what classifies (torch or an ONNX Runtime variant);
+# explanations always come from the PyTorch model
+backend = backend_from_env(GradCAMPP(model, target_layer), split=explain_split(model))
+warmup(backend, device, int(os.getenv("WARMUP_ITERATIONS", "2")), timings=startup_timings)
+
+# inference runs on a bounded pool ("thread" or "process") so the event loop
+# stays free for /health and new uploads; concurrent uploads are grouped
+# into one batched forward+backward per worker
+INFERENCE_POOL = os.getenv("INFERENCE_POOL", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+RETRY_AFTER_SECONDS = os.getenv("RETRY_AFTER_SECONDS", "5")
+
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+BATCH_UPLOAD_MAX_IMAGES = int(os.getenv("BATCH_UPLOAD_MAX_IMAGES", "500"))
+# images of one /predict_batch request, after expanding its ZIP archives
+BATCH_UPLOAD_MAX_BYTES = int(float(os.getenv("BATCH_UPLOAD_MAX_MB", "1024")) * 1024 * 1024)
+# how long a /predict_batch image may wait for room in a full queue before it is
+# answered with 503 (the whole request, if nothing could be queued yet)
+BATCH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("BATCH_QUEUE_TIMEOUT_SECONDS", "30"))
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+# optional cascade (CASCADE_SCREEN): a cheap screen clears likely-"notumor"
+# scans before the multi-class forward + Grad-CAM++ backward
+screen = screen_from_env(device, backend.grad_cam_pp)
+
+# repeated scans are served from a content-addressed cache (keyed per model,
+# backend and cascade setting, which all change the result); process workers
+# keep their own (see app/worker_pool.py), so the API process only needs one
+# for the thread pool
+result_cache = result_cache_from_env(cache_version(model, backend, screen)) if INFERENCE_POOL == "thread" else None
+
+# further models (SERVE_MODELS: binary detectors, MultiClassCNN, U-Net) run next
+# to the ResNet on the same pool; process workers load their own copies
+registry = registry_from_env(device)
+
+executor = create_executor(INFERENCE_POOL, INFERENCE_WORKERS, model, device, backend, result_cache, registry, screen)
+worker_timings = prestart_workers(executor, INFERENCE_WORKERS) if INFERENCE_POOL == "process" else {}
+startup_timings["total"] = time.perf_counter() - _startup_begin
+print("Cold start (s): " + ", ".join(f"{k}={v:.3f}" for k, v in startup_timings.items()))
+batcher_options = dict(
+    max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "8")),
+    max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "10")),
+    executor=executor,
+    max_concurrency=INFERENCE_WORKERS,
+    max_queue=int(os.getenv("INFERENCE_MAX_QUEUE", "64")),
+)
+batcher = MicroBatcher(run_batch, **batcher_options)
+# registry models batch separately, so they run concurrently with Grad-CAM++
+model_batcher = MicroBatcher(run_models, **batcher_options)
+# on-demand explanations for requests classified with explain=false
+explain_batcher = MicroBatcher(run_explain, **batcher_options)
+EXPLAIN_BY_DEFAULT = os.getenv("EXPLAIN_BY_DEFAULT", "1").lower() in ("1", "true", "yes")
+explanation_store = ExplanationStore(
+    max_entries=int(os.getenv("EXPLAIN_STORE_ENTRIES", "256")),
+    max_bytes=int(float(os.getenv("EXPLAIN_STORE_MAX_MB", "256")) * 1024 * 1024),
+    ttl_seconds=float(os.getenv("EXPLAIN_STORE_TTL_SECONDS", "600")),
+)
+
+# visualization encoding (VIS_* variables), overridable per request
+default_encoding = encoding_options_from_env()
+visualization_store = VisualizationStore(
+    max_entries=int(os.getenv("VIS_STORE_ENTRIES", "256")),
+    ttl_seconds=float(os.getenv("VIS_STORE_TTL_SECONDS", "600")),
+)
+
+# Prometheus metrics on /metrics; stage timings come back with every worker
+# result, so recording them is a few dict updates per request
+metrics_registry = MetricsRegistry()
+STAGE_SECONDS = metrics_registry.histogram(
+    "brainet_stage_seconds", "Seconds per request spent in each inference stage", ("stage",))
+REQUEST_SECONDS = metrics_registry.histogram(
+    "brainet_request_seconds", "Request latency until the response starts", ("endpoint",))
+REQUESTS = metrics_registry.counter(
+    "brainet_requests_total", "HTTP requests by endpoint and status code", ("endpoint", "status"))
+IN_FLIGHT = metrics_registry.gauge(
+    "brainet_requests_in_flight", "HTTP requests being handled", ("endpoint",))
+_queues = {"predict": batcher, "models": model_batcher, "explain": explain_batcher}
+metrics_registry.gauge(
+    "brainet_queue_depth", "Requests waiting for a batch", ("queue",),
+    collect=lambda: {(name,): q.queue_depth for name, q in _queues.items()})
+metrics_registry.gauge(
+    "brainet_batches_in_flight", "Batches running on the inference pool", ("queue",),
+    collect=lambda: {(name,): q.stats()["batches_in_flight"] for name, q in _queues.items()})
+metrics_registry.counter(
+    "brainet_requests_rejected_total", "Requests rejected with 503 because the queue was full", ("queue",),
+    collect=lambda: {(name,): q.stats()["requests_rejected"] for name, q in _queues.items()})
+_model_memory = {"resnet18_multiclass": model_memory(model), **registry.memory_stats()}
+metrics_registry.gauge(
+    "brainet_model_memory_bytes", "Bytes held by model parameters and buffers", ("model", "kind"),
+    collect=lambda: {(name, kind): memory[f"{kind}_bytes"]
+                     for name, memory in _model_memory.items() for kind in ("parameter", "buffer")})
+metrics_registry.gauge(
+    "brainet_process_memory_bytes", "API process memory; shared weight pages are split between processes in pss",
+    ("kind",), collect=lambda: {(k,): v for k, v in (process_memory() or {}).items()})
+if result_cache is not None:
+    metrics_registry.counter(
+        "brainet_result_cache_lookups_total", "Result cache lookups by outcome", ("outcome",),
+        collect=lambda: {(k,): v for k, v in result_cache.stats().items() if k in ("hits", "disk_hits", "misses")})
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # label by route template (/explain/{explanation_id}), not the raw path
+    endpoint = next((route.path for route in app.router.routes
+                     if route.matches(request.scope)[0] == Match.FULL), "other")
+    IN_FLIGHT.inc(endpoint)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        IN_FLIGHT.dec(endpoint)
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+        REQUESTS.inc(endpoint, str(status))
+
+def _record_stages(timings):
+    for name, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, name)
+
+@app.on_event("startup")
+async def start_batcher():
+    await batcher.start()
+    await model_batcher.start()
+    await explain_batcher.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await batcher.stop()
+    await model_batcher.stop()
+    await explain_batcher.stop()
+    executor.shutdown(wait=False, cancel_futures=True)
+    backend.close()
+
+def _encoding_from_query(vis_format, vis_quality, vis_max_side, vis_delivery):
+    try:
+        return default_encoding.with_overrides(
+            format=vis_format and vis_format.lower(),
+            quality=vis_quality,
+            max_side=vis_max_side,
+            delivery=vis_delivery and vis_delivery.lower(),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _plan_tasks(tasks):
+    """(requested tasks, registry models to run, detection model or None, run the ResNet?)"""
+    requested = {t.strip().lower() for t in tasks.split(",") if t.strip()}
+    if not requested or requested - set(TASKS):
+        raise HTTPException(status_code=400, detail=f"tasks must be a comma-separated subset of {list(TASKS)}")
+    if "segmentation" in requested and not registry.models_for({"segmentation"}):
+        raise HTTPException(status_code=400, detail="No segmentation model is loaded (see SERVE_MODELS)")
+    extra_models = registry.models_for(requested)
+    detection_model = next((n for n in extra_models if registry.tasks[n] == "detection"), None)
+    # the ResNet classifies, explains, and detects unless a dedicated detector is loaded
+    run_resnet = "classification" in requested or ("detection" in requested and detection_model is None)
+    return requested, extra_models, detection_model, run_resnet
+
+def _queues_for(plan):
+    """The micro-batchers an upload with this task plan is submitted to."""
+    _, extra_models, _, run_resnet = plan
+    return [queue for queue, used in ((batcher, run_resnet), (model_batcher, extra_models)) if used]
+
+async def _wait_for_room(queues, deadline):
+    """Back off until none of `queues` is full; False once time.monotonic() passes `deadline`."""
+    delay = 0.05
+    while any(queue.full for queue in queues):
+        if time.monotonic() + delay > deadline:
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    return True
+
+async def _analyze(file_content, encoding, plan, explain=True, timings=None):
+    """`results` for one upload; raises QueueFullError and UnidentifiedImageError.
+
+    With explain=False the ResNet only classifies; the heatmap and bounding box
+    are computed later by /explain/{id}. Seconds per stage are added to `timings`
+    and the stage histograms; registry model stages are prefixed with "models:".
+    """
+    timings = {} if timings is None else timings
+    requested, extra_models, detection_model, run_resnet = plan
+    # detection alone never shows the heatmap, so it need not pay for it
+    explain = explain and "classification" in requested
+
+    # the upload is decoded in memory by the workers, with the ResNet and
+    # registry models in flight concurrently
+    # both queues are checked before either job is queued, so a rejected upload
+    # leaves no half of its work behind
+    submissions = []
+    if run_resnet:
+        submissions.append((batcher, (file_content, encoding, explain)))
+    if extra_models:
+        submissions.append((model_batcher, (file_content, encoding, extra_models)))
+    for queue, _ in submissions:
+        if queue.full:
+            raise QueueFullError("inference queue is full")
+    jobs = [asyncio.ensure_future(queue.submit(item)) for queue, item in submissions]
+    start = time.perf_counter()
+    try:
+        outputs = await asyncio.gather(*jobs)
+    except BaseException:
+        # a failed (or cancelled) job cancels its sibling, which drops out of its
+        # batch if still queued, and no exception is left unretrieved
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+        raise
+    waited = time.perf_counter() - start
+
+    # (result, timings of its batch) per job
+    result, resnet_timings = outputs.pop(0) if run_resnet else (None, {})
+    model_outputs, model_timings = outputs.pop(0) if extra_models else ({}, {})
+    stage_timings = {**resnet_timings, **{f"models:{k}": v for k, v in model_timings.items()}}
+    # whatever the batches did not spend working was spent queued / being batched
+    stage_timings["queue_wait"] = max(0.0, waited - max(sum(resnet_timings.values()), sum(model_timings.values())))
+    timings.update(stage_timings)
+    _record_stages(stage_timings)
+    timestamp = datetime.now().isoformat()
+    results = {}
+    visualizations = {}
+
+    # determine detection result
+    if "detection" in requested:
+        if detection_model is not None:
+            is_tumor = model_outputs[detection_model]["tumor"]
+            tumor_probability = model_outputs[detection_model]["tumor_probability"]
+            detection_confidence = int((tumor_probability if is_tumor else 1 - tumor_probability) * 100)
+        else:
+            is_tumor = result["prediction"] != "notumor"
+            detection_confidence = int(result["confidence"] * 100) if is_tumor else int((1 - result["confidence"]) * 100)
+        results["detection"] = {
+            "value": "Tumor Present" if is_tumor else "No Tumor Detected",
+            "confidence": detection_confidence,
+            "timestamp": timestamp,
+            "model": detection_model or "resnet18_multiclass"
+        }
+
+    if run_resnet and "classification" in requested:
+        results["classification"] = {
+            "value": result["prediction"],
+            "confidence": int(result["confidence"] * 100),
+            "timestamp": timestamp
+        }
+        results["all_probabilities"] = result["all_probabilities"]
+        if "regions" in result:
+            results["regions"] = result["regions"]
+        visualizations.update(result["visualizations"])
+        if "explanation" in result:
+            explanation_id = explanation_store.put(file_content, result["explanation"], encoding)
+            results["explanation"] = {"id": explanation_id, "url": f"/explain/{explanation_id}"}
+    if run_resnet and "cascade" in result:
+        results["cascade"] = result["cascade"]
+
+    if "segmentation" in requested:
+        segmentation_model = next(n for n in extra_models if registry.tasks[n] == "segmentation")
+        results["segmentation"] = {
+            "tumor_area_fraction": model_outputs[segmentation_model]["tumor_area_fraction"],
+            "timestamp": timestamp,
+            "model": segmentation_model
+        }
+
+    # raw per-model outputs; images are merged into the shared visualizations
+    results["models"] = {}
+    for name, output in model_outputs.items():
+        visualizations.update(output.get("visualizations", {}))
+        results["models"][name] = {k: v for k, v in output.items() if k != "visualizations"}
+
+    results["visualizations"] = visualizations
+    results["visualization_format"] = encoding.media_type
+
+    # base64 visualizations are already inline; "url" serves them from the store
+    if encoding.delivery == "url":
+        vis_id = visualization_store.put(visualizations, encoding.media_type)
+        results["visualizations"] = {name: f"/visualizations/{vis_id}/{name}" for name in visualizations}
+    return results
 
 @app.post("/predict")
-async def predict_tumor(file: UploadFile = File(...)):
-    file_path = None
+async def predict_tumor(
+    file: UploadFile = File(...),
+    vis_format: str = Query(None, description="png, webp or jpeg"),
+    vis_quality: int = Query(None, description="1-100, for webp/jpeg"),
+    vis_max_side: int = Query(None, description="downscale visualizations to this longest side"),
+    vis_delivery: str = Query(None, description="base64, url or multipart"),
+    tasks: str = Query("detection,classification", description="comma-separated: detection, classification, segmentation"),
+    explain: bool = Query(None, description="compute heatmap/bounding box now (false: fetch them from /explain/{id})"),
+):
+    start = time.perf_counter()
     try:
         # validate file
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file provided")
+
+        encoding = _encoding_from_query(vis_format, vis_quality, vis_max_side, vis_delivery)
+        plan = _plan_tasks(tasks)
         
         # validate file size (max 50mb)
         file_content = await file.read()
-        if len(file_content) > 50 * 1024 * 1024:
+        timings = {"upload_read": time.perf_counter() - start}
+        STAGE_SECONDS.observe(timings["upload_read"], "upload_read")
+        if len(file_content) > MAX_UPLOAD_BYTES:
             raise HTTPException(status_code=400, detail="File size too large. Maximum size is 50MB.")
         
-        # save file temporarily
-        os.makedirs("temp", exist_ok=True)
-        file_path = f"temp/{file.filename}"
-        
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-
         # run prediction
-        result = predict(model, device, file_path, target_layer)
-        
-        # determine detection result
-        prediction = result["prediction"]
-        is_tumor = prediction != "notumor"
-        detection_value = "Tumor Present" if is_tumor else "No Tumor Detected"
-        detection_confidence = int(result["confidence"] * 100) if is_tumor else int((1 - result["confidence"]) * 100)
-        
-        timestamp = datetime.now().isoformat()
+        try:
+            results = await _analyze(file_content, encoding, plan, EXPLAIN_BY_DEFAULT if explain is None else explain,
+                                     timings)
+        except QueueFullError:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy. Please retry shortly.",
+                headers={"Retry-After": RETRY_AFTER_SECONDS},
+            )
+        except UnidentifiedImageError:
+            raise HTTPException(status_code=400, detail="Invalid image file. Supported formats: PNG, JPG, JPEG.")
 
-        return {
+        response = {
             "success": True,
-            "results": {
-                "detection": {
-                    "value": detection_value,
-                    "confidence": detection_confidence,
-                    "timestamp": timestamp
-                },
-                "classification": {
-                    "value": prediction,
-                    "confidence": int(result["confidence"] * 100),
-                    "timestamp": timestamp
-                },
-                "all_probabilities": result["all_probabilities"],
-                "visualizations": result["visualizations"]
-            },
-            "processingTime": "N/A",
+            "results": results,
+            "processingTime": f"{time.perf_counter() - start:.3f}s",
+            # the batch this upload ran in; stages of a batch are shared by its requests
+            "stageTimingsMs": {name: round(seconds * 1000, 2) for name, seconds in timings.items()},
             "modelVersion": "ResNet18 Multi-Class Classifier"
         }
+
+        # multipart sends the images as binary parts after the JSON
+        if encoding.delivery == "multipart":
+            visualizations = results["visualizations"]
+            results["visualizations"] = {name: f"part:{name}" for name in visualizations}
+            body, content_type = multipart_body(
+                json.dumps(response).encode(), visualizations, encoding.media_type
+            )
+            return Response(content=body, media_type=content_type)
+
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -94,14 +400,204 @@ async def predict_tumor(file: UploadFile = File(...)):
             status_code=500,
             detail=f"Error processing image: {error_msg}"
         )
-    finally:
-        # clean up temporary file
-        if file_path and os.path.exists(file_path):
+
+def _batch_images(uploads):
+    """(filename, bytes) for every image in the uploads; ZIP archives are expanded.
+
+    The sizes of ZIP members are checked before they are read, so a small archive
+    cannot expand to more than BATCH_UPLOAD_MAX_BYTES of images.
+    """
+    images = []
+    total_bytes = 0
+
+    def check_total(size):
+        nonlocal total_bytes
+        total_bytes += size
+        if total_bytes > BATCH_UPLOAD_MAX_BYTES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Images of one batch may total at most {BATCH_UPLOAD_MAX_BYTES // (1024 * 1024)}MB uncompressed",
+            )
+
+    for name, content in uploads:
+        if not zipfile.is_zipfile(BytesIO(content)):
+            check_total(len(content))
+            images.append((name, content))
+            continue
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            for member in sorted(archive.infolist(), key=lambda m: m.filename):
+                base = os.path.basename(member.filename)
+                if member.is_dir() or base.startswith(".") or "__MACOSX" in member.filename:
+                    continue
+                if not base.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if member.file_size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=400, detail=f"{member.filename} is larger than 50MB")
+                if len(images) > BATCH_UPLOAD_MAX_IMAGES:
+                    break
+                check_total(member.file_size)
+                images.append((member.filename, archive.read(member)))
+    if len(images) > BATCH_UPLOAD_MAX_IMAGES or not images:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Upload between 1 and {BATCH_UPLOAD_MAX_IMAGES} images (files or ZIP archives)",
+        )
+    return images
+
+@app.post("/predict_batch")
+async def predict_batch_endpoint(
+    files: List[UploadFile] = File(..., description="images and/or ZIP archives of images"),
+    vis_format: str = Query(None, description="png, webp or jpeg"),
+    vis_quality: int = Query(None, description="1-100, for webp/jpeg"),
+    vis_max_side: int = Query(None, description="downscale visualizations to this longest side"),
+    vis_delivery: str = Query(None, description="base64 or url"),
+    tasks: str = Query("detection,classification", description="comma-separated: detection, classification, segmentation"),
+    explain: bool = Query(None, description="compute heatmap/bounding box now (false: fetch them from /explain/{id})"),
+):
+    """Stream one NDJSON line per image as soon as it is done (not in upload order)."""
+    encoding = _encoding_from_query(vis_format, vis_quality, vis_max_side, vis_delivery)
+    if encoding.delivery == "multipart":
+        raise HTTPException(status_code=400, detail="vis_delivery=multipart is not supported for batches")
+    plan = _plan_tasks(tasks)
+    explain_now = EXPLAIN_BY_DEFAULT if explain is None else explain
+    uploads = []
+    for file in files:
+        content = await file.read()
+        if len(content) > MAX_UPLOAD_BYTES and not zipfile.is_zipfile(BytesIO(content)):
+            raise HTTPException(status_code=400, detail=f"{file.filename} is larger than 50MB")
+        uploads.append((file.filename, content))
+    images = _batch_images(uploads)
+    queues = _queues_for(plan)
+    # an overloaded server answers 503 like /predict instead of opening a stream
+    if not await _wait_for_room(queues, time.monotonic() + BATCH_QUEUE_TIMEOUT_SECONDS):
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy. Please retry shortly.",
+            headers={"Retry-After": RETRY_AFTER_SECONDS},
+        )
+
+    async def analyze_one(index, filename, content):
+        line = {"index": index, "filename": filename}
+        deadline = time.monotonic() + BATCH_QUEUE_TIMEOUT_SECONDS
+        while True:
             try:
-                os.remove(file_path)
+                start = time.perf_counter()
+                results = await _analyze(content, encoding, plan, explain_now)
+                line.update(success=True, results=results, processingTime=f"{time.perf_counter() - start:.3f}s")
+                return line
+            except QueueFullError:
+                # a batch is one client: wait for room rather than failing its
+                # images, but only up to the deadline
+                if not await _wait_for_room(queues, deadline):
+                    return {**line, "success": False, "status": 503, "error": "Server is busy. Please retry shortly.",
+                            "retryAfter": int(RETRY_AFTER_SECONDS)}
+            except UnidentifiedImageError:
+                return {**line, "success": False, "error": "Invalid image file"}
             except Exception as e:
-                print(f"Error removing temp file: {e}")
+                print(f"Error during batch prediction of {filename}: {e}")
+                return {**line, "success": False, "error": str(e)}
+
+    async def stream():
+        # keep enough images in flight to fill every worker's batches, without
+        # pushing a whole study into the shared queue at once (at most half of it,
+        # leaving room for single /predict calls)
+        window = batcher.max_batch_size * INFERENCE_WORKERS * 2
+        if batcher.max_queue:
+            window = max(1, min(window, batcher.max_queue // 2))
+        todo = iter(enumerate(images))
+        running = set()
+        try:
+            while True:
+                for index, (filename, content) in todo:
+                    running.add(asyncio.create_task(analyze_one(index, filename, content)))
+                    if len(running) >= window:
+                        break
+                if not running:
+                    break
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield json.dumps(task.result()) + "\n"
+        finally:
+            # client disconnected: stop its images and wait until they are gone
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Image-Count": str(len(images))})
+
+@app.get("/explain/{explanation_id}")
+async def explain_prediction(explanation_id: str):
+    """Heatmap and bounding box for a prediction made with explain=false, from
+    the activations captured by that request (no new classification forward,
+    unless the prediction was served from the result cache)."""
+    entry = explanation_store.get(explanation_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Explanation not found or expired")
+    image, state, class_index, encoding = entry
+    start = time.perf_counter()
+    try:
+        explanation, timings = await explain_batcher.submit((image, state, class_index, encoding))
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy. Please retry shortly.",
+            headers={"Retry-After": RETRY_AFTER_SECONDS},
+        )
+
+    timings = {**timings, "queue_wait": max(0.0, time.perf_counter() - start - sum(timings.values()))}
+    _record_stages({f"explain:{name}": seconds for name, seconds in timings.items()})
+
+    visualizations = explanation["visualizations"]
+    results = {
+        "explanation_id": explanation_id,
+        "regions": explanation["regions"],
+        "visualizations": visualizations,
+        "visualization_format": encoding.media_type,
+    }
+    response = {"success": True, "results": results, "processingTime": f"{time.perf_counter() - start:.3f}s"}
+    if encoding.delivery == "url":
+        vis_id = visualization_store.put(visualizations, encoding.media_type)
+        results["visualizations"] = {name: f"/visualizations/{vis_id}/{name}" for name in visualizations}
+    elif encoding.delivery == "multipart":
+        results["visualizations"] = {name: f"part:{name}" for name in visualizations}
+        body, content_type = multipart_body(json.dumps(response).encode(), visualizations, encoding.media_type)
+        return Response(content=body, media_type=content_type)
+    return response
+
+@app.get("/visualizations/{vis_id}/{name}")
+async def get_visualization(vis_id: str, name: str):
+    entry = visualization_store.get(vis_id, name)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Visualization not found or expired")
+    data, media_type = entry
+    return Response(content=data, media_type=media_type)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "model_loaded": model is not None}
+    return {
+        "status": "healthy",
+        "model_loaded": model is not None,
+        "backend": backend.name,
+        "cascade_screen": screen.name if screen is not None else None,
+        "cold_start_seconds": startup_timings,
+        "worker_cold_start_seconds": worker_timings,
+    }
+
+@app.get("/metrics")
+async def metrics(format: str = Query("prometheus", description="prometheus (text exposition) or json")):
+    if format == "prometheus":
+        return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be prometheus or json")
+    return {
+        "pool": {"kind": INFERENCE_POOL, "workers": INFERENCE_WORKERS},
+        "inference": batcher.stats(),
+        "registry_inference": model_batcher.stats(),
+        "explain": {**explain_batcher.stats(), "store": explanation_store.stats()},
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        # parameter count and parameter/buffer bytes per loaded model
+        "models": {"resnet18_multiclass": {"task": "classification", **model_memory(model)},
+                   **registry.memory_stats()},
+        # rss / pss / private bytes of the API process (Linux)
+        "process": process_memory(),
+    }
@@ -1,26 +1,314 @@
+import os
+import json
+import time
+import hashlib
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 from torchvision import models
 from huggingface_hub import hf_hub_download
 
-def load_model():
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+MODEL_REPO_ID = "ThisenEkanayake/brain-tumor-detection"
+MODEL_FILENAME = "multiclass-classification/multi_class_resnet.pth"
 
-    model_path = hf_hub_download(
-        repo_id="ThisenEkanayake/brain-tumor-detection",
-        filename="multiclass-classification/multi_class_resnet.pth"
-    )
+# local artifact store: a verified, ready-to-mmap copy of the weights, so worker
+# starts need neither the network nor a full read of the file
+MODEL_STORE_DIR = os.getenv("MODEL_STORE_DIR", os.path.expanduser("~/.cache/brainet/models"))
+MODEL_SHA256 = os.getenv("MODEL_SHA256")  # expected hash of the downloaded .pth (optional)
+MODEL_OFFLINE = os.getenv("MODEL_OFFLINE", os.getenv("HF_HUB_OFFLINE", "0")).lower() in ("1", "true", "yes")
+MODEL_VERIFY_CHECKSUM = os.getenv("MODEL_VERIFY_CHECKSUM", "1").lower() in ("1", "true", "yes")
+# parameters point straight into the read-only mmap of the weights file, so every
+# process serving it (uvicorn --workers, INFERENCE_POOL=process) shares the same
+# page-cache pages instead of holding a private copy
+MODEL_SHARE_WEIGHTS = os.getenv("MODEL_SHARE_WEIGHTS", "1").lower() in ("1", "true", "yes")
 
-    # model_path = "classification_multi_class/multi_class_resnet.pth"
+_ARTIFACT_NAME = "multi_class_resnet"
+
+# MODEL_OPTIMIZATIONS: comma-separated subset, applied in this order
+#   fuse           fold BatchNorm into the preceding convolutions
+#   channels_last  NHWC memory format for weights and inputs
+#   bf16           bfloat16 autocast (fast on CPUs with AVX512-BF16 / AMX)
+#   compile        torch.compile
+OPTIMIZATIONS = ("fuse", "channels_last", "bf16", "compile")
+# max |probability - FP32 probability| an optimization may introduce
+OPTIMIZATION_TOLERANCE = float(os.getenv("OPTIMIZATION_TOLERANCE", "0.02"))
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _artifact_paths():
+    return (os.path.join(MODEL_STORE_DIR, f"{_ARTIFACT_NAME}.pt"),
+            os.path.join(MODEL_STORE_DIR, f"{_ARTIFACT_NAME}.json"))
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _store_is_valid(weights_path, manifest):
+    if manifest is None or not os.path.exists(weights_path):
+        return False
+    if MODEL_SHA256 and manifest.get("source_sha256") != MODEL_SHA256:
+        print("Model store holds different weights than MODEL_SHA256; refetching")
+        return False
+    if MODEL_VERIFY_CHECKSUM and _sha256(weights_path) != manifest.get("sha256"):
+        print("Model store checksum mismatch; refetching")
+        return False
+    return True
+
+
+def _populate_store(weights_path, manifest_path):
+    """Download (or take from the HF cache when offline) and write the ready artifact."""
+    try:
+        source_path = hf_hub_download(
+            repo_id=MODEL_REPO_ID,
+            filename=MODEL_FILENAME,
+            local_files_only=MODEL_OFFLINE,
+        )
+    except Exception as e:
+        if MODEL_OFFLINE:
+            raise RuntimeError(
+                f"MODEL_OFFLINE is set but no verified model is in {MODEL_STORE_DIR} "
+                f"or the HuggingFace cache; run once with network access to populate it"
+            ) from e
+        raise
+
+    source_sha256 = _sha256(source_path)
+    if MODEL_SHA256 and source_sha256 != MODEL_SHA256:
+        raise RuntimeError(
+            f"Checksum mismatch for {MODEL_FILENAME}: expected {MODEL_SHA256}, got {source_sha256}"
+        )
 
+    # re-save as a plain CPU state dict in the zip format, which torch.load can mmap
+    state_dict = torch.load(source_path, map_location="cpu", weights_only=True)
+    os.makedirs(MODEL_STORE_DIR, exist_ok=True)
+    tmp_path = f"{weights_path}.{os.getpid()}.tmp"
+    torch.save({k: v.contiguous() for k, v in state_dict.items()}, tmp_path)
+    manifest = {
+        "source": f"{MODEL_REPO_ID}/{MODEL_FILENAME}",
+        "source_sha256": source_sha256,
+        "sha256": _sha256(tmp_path),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    os.replace(tmp_path, weights_path)
+    tmp_manifest = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_manifest, manifest_path)
+
+
+def fetch_weights():
+    """Path of verified, mmap-able weights in the local store, fetching them if needed."""
+    weights_path, manifest_path = _artifact_paths()
+    if not _store_is_valid(weights_path, _read_manifest(manifest_path)):
+        _populate_store(weights_path, manifest_path)
+    return weights_path
+
+
+def build_resnet():
+    """The served architecture: ResNet18 with a 4-class head."""
     model = models.resnet18(weights=None)
-    num_ftrs = model.fc.in_features
-    model.fc = nn.Linear(num_ftrs, 4)      # 4 classes
+    model.fc = nn.Linear(model.fc.in_features, 4)      # 4 classes
+    return model
+
+
+def load_weights(build, weights_path, share=None):
+    """build() a model and load the state dict at `weights_path` into it.
+
+    Shared (default: MODEL_SHARE_WEIGHTS), the model is built on the meta device
+    (no random init) and its tensors are assigned the mmapped ones from the file.
+    Pages are then read on demand and shared with every other process that maps
+    the same file. Otherwise the weights are copied into private memory.
+    """
+    share = MODEL_SHARE_WEIGHTS if share is None else share
+    state_dict = torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True)
+    if not share:
+        model = build()
+        model.load_state_dict(state_dict)
+        return model
+    with torch.device("meta"):
+        model = build()
+    model.load_state_dict(state_dict, assign=True)
+    return model
+
+
+def load_model(timings=None, optimizations=None):
+    """Returns (model, device, target_layer); phase durations (seconds) go into `timings`.
+
+    `optimizations` (default: MODEL_OPTIMIZATIONS) are applied with optimize_model()
+    after loading.
+    """
+    timings = timings if timings is not None else {}
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    start = time.perf_counter()
+    model_path = fetch_weights()
+    timings["fetch"] = time.perf_counter() - start
+
+    # model_path = "classification_multi_class/multi_class_resnet.pth"
 
-    model.load_state_dict(torch.load(model_path, map_location=device))
+    start = time.perf_counter()
+    model = load_weights(build_resnet, model_path)
     model.to(device)
     model.eval()
+    timings["load"] = time.perf_counter() - start
 
     target_layer = model.layer4[-1].conv2
 
+    if optimizations is None:
+        optimizations = optimizations_from_env()
+    if optimizations:
+        start = time.perf_counter()
+        optimize_model(model, target_layer, optimizations)
+        timings["optimize"] = time.perf_counter() - start
+
     return model, device, target_layer
+
+
+def optimizations_from_env():
+    names = [n.strip().lower() for n in os.getenv("MODEL_OPTIMIZATIONS", "").split(",") if n.strip()]
+    unknown = set(names) - set(OPTIMIZATIONS)
+    if unknown:
+        raise ValueError(f"Unknown model optimizations {sorted(unknown)}; expected a subset of {list(OPTIMIZATIONS)}")
+    return names
+
+
+def validation_batch(n=4, size=224, seed=0):
+    """Deterministic, normalized batch of synthetic scans: a head-shaped ellipse with
+    smooth tissue texture and one bright lesion on a dark background.
+
+    Unlike Gaussian noise, which drives the softmax into saturation, these give
+    probabilities that move when an optimization introduces real drift.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    yy, xx = torch.meshgrid(torch.linspace(-1, 1, size), torch.linspace(-1, 1, size), indexing="ij")
+    head = ((xx / 0.8) ** 2 + (yy / 0.9) ** 2 < 1).float()
+    scans = []
+    for _ in range(n):
+        texture = F.interpolate(torch.rand(1, 1, 8, 8, generator=generator), size=(size, size),
+                                mode="bicubic", align_corners=False)[0, 0]
+        cy, cx = (torch.rand(2, generator=generator) - 0.5) * 0.8
+        lesion = torch.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / 0.02)
+        scans.append((head * (0.25 + 0.35 * texture) + 0.5 * lesion).clamp(0, 1).expand(3, size, size))
+    mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+    std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+    return (torch.stack(scans) - mean) / std
+
+
+def optimize_model(model, target_layer, optimizations, tolerance=OPTIMIZATION_TOLERANCE):
+    """Apply `optimizations` (see OPTIMIZATIONS) to an eval-mode ResNet in place.
+
+    Everything stays differentiable and `target_layer` keeps its pre-BatchNorm
+    output, so Grad-CAM++ works unchanged. After each step the softmax outputs on
+    validation_batch() are compared with the FP32 model; a step that moves any
+    probability by more than `tolerance` raises RuntimeError. Must run before
+    Grad-CAM++ hooks are attached.
+    """
+    device = next(model.parameters()).device
+    sample = validation_batch().to(device)
+    with torch.no_grad():
+        reference = torch.softmax(model(sample), dim=1)
+
+    applied = []
+    for name in (n for n in OPTIMIZATIONS if n in optimizations):
+        if name == "fuse":
+            _fuse_conv_bn(model, keep=target_layer)
+        elif name == "channels_last":
+            model.to(memory_format=torch.channels_last)
+            model.register_forward_pre_hook(_to_channels_last)
+        elif name == "bf16":
+            # the explained block is wrapped too, so explain_split()'s tail runs under autocast
+            for module in (model, model.layer4[-1]):
+                _autocast(module, device.type, torch.bfloat16)
+        elif name == "compile":
+            model.compile()
+        applied.append(name)
+
+        with torch.no_grad():
+            error = (torch.softmax(model(sample).float(), dim=1) - reference).abs().max().item()
+        if error > tolerance:
+            raise RuntimeError(
+                f"Model optimization {name!r} (after {applied[:-1]}) changed probabilities by {error:.4f}, "
+                f"more than the tolerance of {tolerance}"
+            )
+        print(f"Model optimization {name}: max probability change {error:.2e}")
+
+    model.optimizations = tuple(applied)
+    return model
+
+
+def _fuse_conv_bn(model, keep=None):
+    """Fold every BatchNorm of a torchvision ResNet into its convolution, except
+    after `keep` (the Grad-CAM++ layer, whose raw output must stay observable)."""
+    pairs = [(model, "conv1", "bn1")]
+    for layer in (model.layer1, model.layer2, model.layer3, model.layer4):
+        for block in layer:
+            pairs += [(block, "conv1", "bn1"), (block, "conv2", "bn2")]
+            if block.downsample is not None:
+                pairs.append((block.downsample, "0", "1"))
+    for parent, conv_name, bn_name in pairs:
+        conv = getattr(parent, conv_name)
+        if conv is keep:
+            continue
+        setattr(parent, conv_name, fuse_conv_bn_eval(conv, getattr(parent, bn_name)))
+        setattr(parent, bn_name, nn.Identity())
+
+
+def _to_channels_last(module, args):
+    return (args[0].contiguous(memory_format=torch.channels_last), *args[1:])
+
+
+def _autocast(module, device_type, dtype):
+    """Run module.forward under autocast, returning float32 outputs."""
+    forward = module.forward
+
+    def autocast_forward(*args, **kwargs):
+        with torch.autocast(device_type, dtype=dtype):
+            return forward(*args, **kwargs).float()
+
+    module.forward = autocast_forward
+
+
+def explain_split(model):
+    """(block, tail) for lazy Grad-CAM++: the last layer4 block holds the target
+    layer, and tail(block input) finishes the ResNet forward from there."""
+    block = model.layer4[-1]
+
+    def tail(x):
+        return model.fc(torch.flatten(model.avgpool(block(x)), 1))
+
+    return block, tail
+
+
+def warmup(backend, device, iterations=2, batch_size=1, timings=None):
+    """Run dummy inferences through `backend` (app.backends) so the first real
+    request does not pay for lazy allocator / kernel / session initialization."""
+    start = time.perf_counter()
+    dummy = torch.zeros(batch_size, 3, 224, 224, device=device)
+    for _ in range(iterations):
+        backend.infer(dummy)
+    if timings is not None:
+        timings["warmup"] = time.perf_counter() - start
+
+
+def model_version(model):
+    """Short content hash of the model weights; changes whenever the weights (or
+    the numerics-changing optimizations applied to them) do."""
+    digest = hashlib.sha256()
+    for name, tensor in model.state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().numpy().tobytes())
+    version = f"resnet18-multiclass-{digest.hexdigest()[:12]}"
+    optimizations = getattr(model, "optimizations", ())
+    return "+".join((version, *optimizations)) if optimizations else version
@@ -0,0 +1,197 @@
+import os
+from dataclasses import dataclass
+from typing import Callable
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+from torchvision import models, transforms
+from app.inference import CLASS_NAMES, DEFAULT_ENCODING, decode_image, transform
+from app.encoding import encode_visualizations
+from app.metrics import stage
+from app.model_loader import load_weights
+
+TASKS = ("detection", "classification", "segmentation")
+
+# preprocessing pipelines, keyed so models trained with the same one share the tensor
+PREPROCESSING = {
+    "imagenet_224": transform,
+    "gray_224": transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize([0.5], [0.5]),
+    ]),
+    "unit_256": transforms.Compose([
+        transforms.Resize((256, 256)),
+        transforms.ToTensor(),
+    ]),
+}
+
+
+def _binary_cnn():
+    from classification_binary.binary_cnn_model import SimpleCNN
+    return SimpleCNN()
+
+
+def _binary_resnet():
+    model = models.resnet18(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, 1)
+    return model
+
+
+def _multiclass_cnn():
+    from classification_multi_class.multi_class_cnn_model import MultiClassCNN
+    return MultiClassCNN(num_classes=len(CLASS_NAMES))
+
+
+def _unet():
+    from segmentation_with_unet.unet_model import UNet
+    return UNet(n_channels=3, n_classes=1)
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """How to build, feed and read one of the repo's trained models."""
+    task: str
+    build: Callable[[], nn.Module]
+    preprocessing: str
+
+
+SPECS = {
+    "binary_cnn": ModelSpec("detection", _binary_cnn, "gray_224"),
+    "binary_resnet": ModelSpec("detection", _binary_resnet, "gray_224"),
+    "multiclass_cnn": ModelSpec("classification", _multiclass_cnn, "imagenet_224"),
+    "unet": ModelSpec("segmentation", _unet, "unit_256"),
+}
+
+
+def model_memory(model):
+    """Bytes held by a model's parameters and buffers."""
+    parameters = list(model.parameters())
+    return {
+        "parameters": sum(p.numel() for p in parameters),
+        "parameter_bytes": sum(p.numel() * p.element_size() for p in parameters),
+        "buffer_bytes": sum(b.numel() * b.element_size() for b in model.buffers()),
+    }
+
+
+def process_memory():
+    """{"rss", "pss", "private"} bytes of this process (Linux), or None.
+
+    Pages shared with other processes (e.g. mmapped weights) count fully in RSS
+    but are split between the sharers in PSS; "private" is what the process alone holds.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0]) * 1024
+    except OSError:
+        return None
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+class ModelRegistry:
+    """Models served next to the Grad-CAM++ ResNet, run side by side on shared inputs.
+
+    Each upload is decoded once per batch and each preprocessing pipeline runs once
+    per image, however many models consume it.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self._models = {}  # name -> (spec, model, memory)
+
+    def load(self, name, weights_path):
+        if name not in SPECS:
+            raise ValueError(f"Unknown model {name!r}; expected one of {sorted(SPECS)}")
+        spec = SPECS[name]
+        model = load_weights(spec.build, weights_path)
+        model.to(self.device)
+        model.eval()
+        self._models[name] = (spec, model, model_memory(model))
+
+    @property
+    def tasks(self):
+        """{model name: task} of the loaded models."""
+        return {name: spec.task for name, (spec, _, _) in self._models.items()}
+
+    def models_for(self, tasks):
+        return tuple(name for name, task in self.tasks.items() if task in tasks)
+
+    def memory_stats(self):
+        return {name: {"task": spec.task, **memory} for name, (spec, _, memory) in self._models.items()}
+
+    def run(self, images, model_names, encodings=None, timings=None):
+        """Run image i through every model in model_names[i].
+
+        Returns one entry per image: {model name: output}, or the exception raised
+        while decoding that image. If given, `timings` accumulates seconds per stage.
+        """
+        encodings = [e or DEFAULT_ENCODING for e in (encodings or [None] * len(images))]
+        results = [None] * len(images)
+        decoded = {}
+        for i, image in enumerate(images):
+            try:
+                with stage(timings, "decode"):
+                    decoded[i] = decode_image(image)
+                results[i] = {}
+            except Exception as e:
+                results[i] = e
+
+        tensors = {}  # (preprocessing, image position) -> tensor
+        for name in dict.fromkeys(n for names in model_names for n in names):
+            spec, model, _ = self._models[name]
+            positions = [i for i in decoded if name in model_names[i]]
+            if not positions:
+                continue
+            with stage(timings, "transform"):
+                for i in positions:
+                    if (spec.preprocessing, i) not in tensors:
+                        tensors[spec.preprocessing, i] = PREPROCESSING[spec.preprocessing](decoded[i])
+                batch = torch.stack([tensors[spec.preprocessing, i] for i in positions]).to(self.device)
+            with stage(timings, f"forward:{name}"), torch.no_grad():
+                outputs = model(batch).float().cpu()
+            for i, output in zip(positions, outputs):
+                results[i][name] = _read_output(spec.task, output, decoded[i], encodings[i], timings)
+        return results
+
+
+def _read_output(task, output, image, encoding, timings=None):
+    if task == "detection":
+        # binary models are trained on ImageFolder("no", "yes"): class 1 is tumor
+        probability = float(torch.sigmoid(output[0]))
+        return {"task": task, "tumor_probability": probability, "tumor": probability >= 0.5}
+    if task == "classification":
+        probs = torch.softmax(output, dim=0).numpy()
+        return {
+            "task": task,
+            "prediction": CLASS_NAMES[probs.argmax()],
+            "confidence": float(probs.max()),
+            "all_probabilities": {name: float(p) for name, p in zip(CLASS_NAMES, probs)},
+        }
+
+    # segmentation: threshold at the model's resolution, then scale the mask to the upload
+    with stage(timings, "overlay"):
+        mask = (torch.sigmoid(output[0]) > 0.5).numpy().astype(np.uint8) * 255
+        mask = np.array(Image.fromarray(mask).resize(image.size, Image.NEAREST)) > 0
+        overlay = np.array(image)
+        overlay[mask] = (0.5 * overlay[mask] + [127, 0, 0]).astype(np.uint8)
+    return {
+        "task": task,
+        "tumor_area_fraction": float(mask.mean()),
+        "visualizations": encode_visualizations({"segmentation": overlay}, encoding, timings),
+    }
+
+
+def registry_from_env(device):
+    """ModelRegistry loading SERVE_MODELS, e.g. "unet=best_unet_model.pth,binary_cnn=binary_cnn_v2.pth"."""
+    registry = ModelRegistry(device)
+    for entry in filter(None, (e.strip() for e in os.getenv("SERVE_MODELS", "").split(","))):
+        name, sep, weights_path = entry.partition("=")
+        if not sep:
+            raise ValueError(f"SERVE_MODELS entry {entry!r} must be name=weights_path")
+        registry.load(name.strip(), weights_path.strip())
+    return registry
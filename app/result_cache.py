@@ -0,0 +1,152 @@
+import os
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Content-addressed cache of prediction results.
+
+    Keys hash the decoded pixels together with the model version, so re-uploads of
+    the same scan hit regardless of file name or container format, and a new model
+    never serves stale results. The in-memory tier is an LRU bounded by entry count,
+    total size and TTL; the optional on-disk tier (`disk_dir`) survives restarts and
+    is shared by every worker process pointing at the same directory.
+    """
+
+    def __init__(self, model_version, max_entries=256, max_bytes=256 * 1024 * 1024,
+                 ttl_seconds=3600, disk_dir=None):
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (stored_at, size, result)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def key(self, image, variant=""):
+        """Key for a decoded PIL image; `variant` separates differently encoded results."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(self.model_version.encode())
+        digest.update(variant.encode())
+        digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, size, result = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                self._remove(key)
+
+        result = self._disk_get(key, now)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, result, now)
+        return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._insert(key, result, time.time())
+        self._disk_put(key, result)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "model_version": self.model_version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "disk_tier": self.disk_dir,
+            }
+
+    # ---------------- memory tier (caller holds the lock) ----------------
+    def _insert(self, key, result, stored_at):
+        if key in self._entries:
+            self._remove(key)
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (stored_at, size, result)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    # ---------------- disk tier ----------------
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.pkl")
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if now - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _disk_put(self, key, result):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)  # atomic, so readers never see partial files
+        except OSError as e:
+            print(f"Error writing result cache entry: {e}")
+
+
+def _result_size(result):
+    # the encoded visualizations dominate; the rest is a few hundred bytes
+    return 1024 + sum(len(v) for v in result.get("visualizations", {}).values() if v)
+
+
+def result_cache_from_env(model_version):
+    """ResultCache configured by RESULT_CACHE_* variables, or None if disabled."""
+    max_entries = int(os.getenv("RESULT_CACHE_ENTRIES", "256"))
+    if max_entries <= 0:
+        return None
+    return ResultCache(
+        model_version,
+        max_entries=max_entries,
+        max_bytes=int(float(os.getenv("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024),
+        ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600")),
+        disk_dir=os.getenv("RESULT_CACHE_DIR") or None,
+    )
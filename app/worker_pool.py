@@ -0,0 +1,119 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import torch
+from app.inference import explain_batch, predict_batch
+from app.model_loader import model_version
+
+# per-process inference state; filled by init_worker() in the API process
+# (thread pool) or in each child (process pool)
+_state = {}
+
+
+def init_worker(model=None, device=None, backend=None, num_threads=None, cache=None, registry=None,
+                screen=None):
+    if model is None:
+        # process pool: every child loads its own copy of the model and cache
+        # (the RESULT_CACHE_DIR disk tier is still shared between children)
+        from app.backends import backend_from_env
+        from app.cascade import screen_from_env
+        from app.model_loader import explain_split, load_model, warmup
+        from app.model_registry import registry_from_env
+        from app.result_cache import result_cache_from_env
+        from gradcam_pp import GradCAMPP
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        timings = {}
+        start = time.perf_counter()
+        model, device, target_layer = load_model(timings)
+        backend = backend_from_env(GradCAMPP(model, target_layer), num_threads, explain_split(model))
+        warmup(backend, device, int(os.getenv("WARMUP_ITERATIONS", "2")), timings=timings)
+        timings["total"] = time.perf_counter() - start
+        screen = screen_from_env(device, backend.grad_cam_pp, num_threads)
+        cache = result_cache_from_env(cache_version(model, backend, screen))
+        registry = registry_from_env(device)
+        _state["timings"] = timings
+    elif num_threads:
+        torch.set_num_threads(num_threads)
+    _state.update(model=model, device=device, backend=backend, cache=cache, registry=registry, screen=screen)
+
+
+def cache_version(model, backend, screen):
+    """Result cache version: everything that changes what predict_batch returns."""
+    version = f"{model_version(model)}+{backend.name}"
+    if screen is not None:
+        version += f"+{screen.name}@{screen.threshold}"
+    return version
+
+
+def worker_ready(barrier=None):
+    """Returns (pid, cold-start timings) once this worker has loaded and warmed up.
+
+    With a barrier, the task holds its worker until every party has arrived, so no
+    worker can answer for another."""
+    if barrier is not None:
+        barrier.wait()
+    return os.getpid(), _state.get("timings")
+
+
+def run_batch(items):
+    """items: (upload bytes, EncodingOptions, explain now?) triples."""
+    images = [image for image, _, _ in items]
+    encodings = [encoding for _, encoding, _ in items]
+    explain = [explain for _, _, explain in items]
+    timings = {}
+    results = predict_batch(_state["backend"], _state["device"], images, _state["cache"], encodings,
+                            _state["screen"], explain, timings)
+    return _with_timings(results, timings)
+
+
+def run_explain(items):
+    """items: (upload bytes, explanation state, class index, EncodingOptions)."""
+    timings = {}
+    return _with_timings(explain_batch(_state["backend"], _state["device"], items, timings), timings)
+
+
+def run_models(items):
+    """items: (upload bytes, EncodingOptions, registry model names) triples."""
+    images = [image for image, _, _ in items]
+    encodings = [encoding for _, encoding, _ in items]
+    model_names = [names for _, _, names in items]
+    timings = {}
+    return _with_timings(_state["registry"].run(images, model_names, encodings, timings), timings)
+
+
+def _with_timings(results, timings):
+    # every request in a batch waited for the whole batch, so each gets its stage timings;
+    # failed entries stay bare exceptions for the caller to raise
+    return [r if isinstance(r, Exception) else (r, timings) for r in results]
+
+
+def create_executor(kind="thread", workers=1, model=None, device=None, backend=None, cache=None,
+                    registry=None, screen=None):
+    """Executor that runs `run_batch`, `run_explain` and `run_models`: threads share the API
+    process' models, processes each load their own (spawned, so torch thread pools
+    are not forked)."""
+    if kind == "thread":
+        init_worker(model, device, backend, cache=cache, registry=registry, screen=screen)
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+    if kind == "process":
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(None, None, None, threads_per_worker),
+        )
+    raise ValueError(f"Unknown inference pool kind: {kind!r} (expected 'thread' or 'process')")
+
+
+def prestart_workers(executor, workers):
+    """Start every process worker now (they spawn lazily otherwise) and wait until
+    each has loaded and warmed up its model. Returns {pid: timings}."""
+    # a manager barrier, since plain multiprocessing locks cannot be sent to pool tasks
+    with multiprocessing.get_context("spawn").Manager() as manager:
+        barrier = manager.Barrier(workers)
+        futures = [executor.submit(worker_ready, barrier) for _ in range(workers)]
+        return dict(future.result() for future in futures)
@@ -0,0 +1,101 @@
+import os
+import math
+import torch
+import torch.nn.functional as F
+
+# Batched augmentation: the random flip / rotation / color jitter of the training
+# transforms, applied after collation to a whole uint8 batch with vectorized ops (on
+# the training device), instead of per sample on PIL images in the loader.
+#   DATA_BATCH_AUGMENT  1 to augment whole batches, 0 (default) for the per-sample transforms
+DATA_BATCH_AUGMENT = os.getenv("DATA_BATCH_AUGMENT", "0").lower() in ("1", "true", "yes")
+
+_GRAY = (0.2989, 0.587, 0.114)  # rgb_to_grayscale weights used by ColorJitter's contrast
+
+
+class BatchAugment:
+    """uint8 (B, C, H, W) batch -> augmented float batch, with per-sample random parameters.
+
+    Draws the same distributions as RandomHorizontalFlip(flip_p), RandomRotation(degrees)
+    (nearest, zero fill), ColorJitter(brightness, contrast) (factors uniform in
+    [1 - x, 1 + x], applied in random order) followed by ToTensor and Normalize(mean, std).
+    Masks passed alongside are flipped and rotated with their images, never jittered,
+    and returned binarized like `mask > 0.5`.
+    """
+
+    def __init__(self, flip_p=0.5, degrees=10, brightness=0.0, contrast=0.0, mean=None, std=None):
+        self.flip_p = flip_p
+        self.degrees = degrees
+        self.brightness = brightness
+        self.contrast = contrast
+        self.mean = mean
+        self.std = std
+
+    def __call__(self, images, masks=None):
+        channels = images.shape[1]
+        x = images if masks is None else torch.cat([images, masks.to(images.dtype)], dim=1)
+        # flip and rotation only move pixels, so they run on the uint8 batch
+        x = self._geometry(x)
+        images = self._jitter(x[:, :channels].float())
+        # ToTensor and Normalize folded into one per-channel scale and shift
+        scale = torch.full((1, channels, 1, 1), 1 / 255, device=x.device)
+        shift = torch.zeros(1, channels, 1, 1, device=x.device)
+        if self.mean is not None:
+            mean = torch.tensor(self.mean, device=x.device).view(1, -1, 1, 1)
+            std = torch.tensor(self.std, device=x.device).view(1, -1, 1, 1)
+            scale, shift = scale / std, (shift - mean) / std
+        images = torch.addcmul(shift, images, scale, out=images)
+        if masks is None:
+            return images
+        return images, (x[:, channels:] > 127).float()
+
+    def _uniform(self, x, low, high):
+        return torch.empty(x.shape[0], 1, 1, 1, device=x.device).uniform_(low, high)
+
+    def _geometry(self, x):
+        """Random flip, then nearest-neighbour rotation about the center with zero fill.
+
+        Both only decide which source pixel lands where, so they are done as one gather:
+        the flip mirrors the rotated source column, and a zero border wide enough for
+        the largest rotation stands in for out-of-image sources.
+        """
+        n, c, h, w = x.shape
+        flip = torch.rand(n, 1, 1, device=x.device) < self.flip_p
+        if not self.degrees:
+            return torch.where(flip.unsqueeze(1), x.flip(-1), x) if self.flip_p else x
+        angle = self._uniform(x, -self.degrees, self.degrees).view(n, 1, 1) * (math.pi / 180)
+        cos, sin = torch.cos(angle), torch.sin(angle)
+        dy = (torch.arange(h, device=x.device) - (h - 1) / 2).view(1, h, 1)
+        dx = (torch.arange(w, device=x.device) - (w - 1) / 2).view(1, 1, w)
+        reach = (cos.abs() * max(h, w) / 2 + sin.abs() * max(h, w) / 2).max().item()
+        pad = max(0, math.ceil(reach - min(h, w) / 2)) + 1
+        # source pixel of every output pixel, rounded half-to-even like grid_sample's nearest mode
+        xs = (cos * dx + (w - 1) / 2 - sin * dy).round_()
+        xs = torch.where(flip, (w - 1) - xs, xs).add_(pad)
+        ys = (sin * dx + (h - 1) / 2 + cos * dy).round_().add_(pad)
+        index = torch.addcmul(xs, ys, torch.tensor(float(w + 2 * pad), device=x.device)).long()
+        padded = F.pad(x, (pad, pad, pad, pad))
+        return padded.flatten(2).gather(2, index.view(n, 1, h * w).expand(n, c, h * w)).view_as(x)
+
+    def _jitter(self, x):
+        """Brightness and contrast in a random order per sample.
+
+        Either order is two per-sample affine maps, each clamped to [0, 255]:
+        brightness is (b, 0) and contrast is (c, (1 - c) * mean gray). The mean gray is
+        linear in the channel means, so both orders cost two passes over the batch.
+        """
+        if not self.brightness and not self.contrast:
+            return x
+        b = self._uniform(x, 1 - self.brightness, 1 + self.brightness)
+        c = self._uniform(x, 1 - self.contrast, 1 + self.contrast)
+        brightness_first = torch.rand(x.shape[0], 1, 1, 1, device=x.device) < 0.5
+        gray = torch.tensor(_GRAY, device=x.device).view(1, -1, 1, 1)
+
+        def mean_gray(y):
+            return (y.mean(dim=(2, 3), keepdim=True) * gray).sum(1, keepdim=True)
+
+        first_scale = torch.where(brightness_first, b, c)
+        first_shift = torch.where(brightness_first, torch.zeros_like(c), (1 - c) * mean_gray(x))
+        x = torch.addcmul(first_shift, x, first_scale, out=x).clamp_(0, 255)
+        second_scale = torch.where(brightness_first, c, b)
+        second_shift = torch.where(brightness_first, (1 - c) * mean_gray(x), torch.zeros_like(c))
+        return torch.addcmul(second_shift, x, second_scale, out=x).clamp_(0, 255)
@@ -0,0 +1,51 @@
+# python -m benchmarks.benchmark_backends [--backends torch onnx-fp32 onnx-fp16 onnx-int8] [--batch-sizes 1 8]
+# ONNX models are read from ONNX_MODEL_DIR (default onnx/); missing ones are skipped.
+import argparse
+import os
+import numpy as np
+import torch
+from app.backends import BACKENDS, create_backend
+from gradcam_pp import GradCAMPP
+from benchmarks.common import build_model, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=None, help="torch and ONNX Runtime intra-op threads")
+    parser.add_argument("--weights", type=str, default=None, help="multi_class_resnet.pth the ONNX files were exported from")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model, device, target_layer = build_model(args.weights)
+    grad_cam_pp = GradCAMPP(model, target_layer)
+    inputs = {n: torch.randn(n, 3, 224, 224, generator=torch.Generator().manual_seed(0)) for n in args.batch_sizes}
+    reference = {n: create_backend("torch", grad_cam_pp).classify(x) for n, x in inputs.items()}
+
+    print(f"{'backend':<10} {'batch':>5} {'classify ms':>12} {'img/s':>8} {'+ Grad-CAM ms':>14} {'img/s':>8} "
+          f"{'max |dlogit|':>13} {'top-1 agree':>12}")
+    for name in args.backends:
+        try:
+            backend = create_backend(name, grad_cam_pp, args.threads)
+        except (RuntimeError, FileNotFoundError) as e:
+            print(f"{name:<10} skipped: {e}")
+            continue
+        for n, x in inputs.items():
+            logits = backend.classify(x)
+            diff = np.abs(logits - reference[n]).max()
+            agree = (logits.argmax(1) == reference[n].argmax(1)).mean()
+            classify = time_calls(lambda: backend.classify(x), args.iterations).mean()
+            full = time_calls(lambda: backend.infer(x), args.iterations).mean()
+            print(f"{name:<10} {n:>5} {classify:>12.2f} {n * 1000 / classify:>8.1f} {full:>14.2f} "
+                  f"{n * 1000 / full:>8.1f} {diff:>13.2e} {agree:>12.0%}")
+
+    grad_cam_pp.detach()
+    if not os.path.isdir(os.getenv("ONNX_MODEL_DIR", "onnx")):
+        print("\nONNX_MODEL_DIR does not exist; export the models with the scripts in onnx/")
+
+
+if __name__ == "__main__":
+    main()
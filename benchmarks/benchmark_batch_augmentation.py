@@ -0,0 +1,88 @@
+# python -m benchmarks.benchmark_batch_augmentation [--batch-sizes 16 64] [--size 224]
+# Multi-class train augmentations (flip, rotation, color jitter, normalize) on already
+# resized uint8 images: per sample on PIL images (the default loader path), per sample
+# on tensors (DATA_PACKED) and batch_augment.BatchAugment on the collated batch
+# (DATA_BATCH_AUGMENT). A distribution check compares the per-image output statistics
+# of the PIL path and BatchAugment over many draws on the same inputs.
+import argparse
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+from classification_multi_class.multi_class_dataset_preprocessing import augment_batch, packed_train_transforms
+from batch_augment import BatchAugment
+from benchmarks.common import time_calls
+
+MEAN, STD = [0.485, 0.456, 0.406], [0.229, 0.224, 0.225]
+
+pil_augment = transforms.Compose([
+    transforms.RandomHorizontalFlip(p=0.5),
+    transforms.RandomRotation(10),
+    transforms.ColorJitter(brightness=0.2, contrast=0.2),
+    transforms.ToTensor(),
+    transforms.Normalize(MEAN, STD),
+])
+
+
+def make_batch(n, size, seed=0):
+    """Smooth synthetic scans: a bright off-center blob on a darker background."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size] / size
+    images = []
+    for _ in range(n):
+        cy, cx = rng.uniform(0.3, 0.7, 2)
+        blob = np.exp(-((yy - cy) ** 2 + (xx - cx) ** 2) / 0.02)
+        gray = np.clip(40 + 180 * blob + rng.normal(0, 10, blob.shape), 0, 255).astype(np.uint8)
+        images.append(np.repeat(gray[None], 3, axis=0))
+    return torch.from_numpy(np.stack(images))
+
+
+def per_sample_pil(batch):
+    return torch.stack([pil_augment(Image.fromarray(image.permute(1, 2, 0).numpy())) for image in batch])
+
+
+def per_sample_tensor(batch):
+    return torch.stack([packed_train_transforms(image) for image in batch])
+
+
+def image_stats(outputs):
+    flat = outputs.flatten(1)
+    return flat.mean(1), flat.std(1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--size", type=int, default=224)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--draws", type=int, default=50, help="augmentation draws for the distribution check")
+    args = parser.parse_args()
+
+    batched = augment_batch or BatchAugment(flip_p=0.5, degrees=10, brightness=0.2, contrast=0.2, mean=MEAN, std=STD)
+    for n in args.batch_sizes:
+        batch = make_batch(n, args.size)
+        paths = {
+            "per-sample PIL": lambda: per_sample_pil(batch),
+            "per-sample tensor": lambda: per_sample_tensor(batch),
+            "BatchAugment": lambda: batched(batch),
+        }
+        print(f"batch {n}, {args.size}x{args.size}:")
+        baseline = None
+        for name, fn in paths.items():
+            ms = time_calls(fn, args.iterations).mean()
+            baseline = baseline or ms
+            print(f"  {name:<20} {ms:9.2f} ms/batch  {n * 1000 / ms:9.1f} img/s  {baseline / ms:6.2f}x")
+
+    batch = make_batch(16, args.size, seed=1)
+    pil = [image_stats(per_sample_pil(batch)) for _ in range(args.draws)]
+    ours = [image_stats(batched(batch)) for _ in range(args.draws)]
+    print(f"distribution over {args.draws} draws of 16 images (mean / std across draws):")
+    for name, stats in (("per-sample PIL", pil), ("BatchAugment", ours)):
+        means = torch.stack([m for m, _ in stats])
+        stds = torch.stack([s for _, s in stats])
+        print(f"  {name:<20} image mean {means.mean():7.4f} / {means.std(0).mean():6.4f}   "
+              f"image std {stds.mean():7.4f} / {stds.std(0).mean():6.4f}")
+
+
+if __name__ == "__main__":
+    main()
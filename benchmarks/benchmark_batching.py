@@ -0,0 +1,62 @@
+# python -m benchmarks.benchmark_batching [--concurrency 1 4 16 32] [--batch-sizes 1 8]
+import argparse
+import asyncio
+import time
+import numpy as np
+from app.batching import MicroBatcher
+from app.backends import TorchBackend
+from app.inference import predict_batch
+from gradcam_pp import GradCAMPP
+from benchmarks.common import build_model, make_image, default_image_path
+
+
+async def run_load(batcher, item, concurrency, requests_per_client):
+    latencies = []
+
+    async def client():
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            await batcher.submit(item)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, np.array(latencies)
+
+
+async def main_async(args):
+    model, device, target_layer = build_model(args.weights)
+    backend = TorchBackend(GradCAMPP(model, target_layer))
+    with open(make_image(default_image_path(), args.size), "rb") as f:
+        upload = f.read()
+
+    print(f"{'max batch':>9} {'wait ms':>8} {'clients':>8} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for max_batch_size in args.batch_sizes:
+        batcher = MicroBatcher(
+            lambda uploads: predict_batch(backend, device, uploads),
+            max_batch_size=max_batch_size,
+            max_wait_ms=args.max_wait_ms,
+        )
+        await batcher.start()
+        await run_load(batcher, upload, 1, 2)  # warmup
+        for concurrency in args.concurrency:
+            throughput, latencies = await run_load(batcher, upload, concurrency, args.requests_per_client)
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(f"{max_batch_size:>9} {args.max_wait_ms:>8g} {concurrency:>8} {throughput:>8.2f} {p50:>9.1f} {p99:>9.1f}")
+        await batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--size", type=int, default=256, help="side of the synthetic scan")
+    parser.add_argument("--weights", type=str, default=None)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
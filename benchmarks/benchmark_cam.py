@@ -0,0 +1,72 @@
+# python -m benchmarks.benchmark_cam [--batch-sizes 1 8 32]
+import argparse
+import time
+import numpy as np
+import torch
+import torch.nn.functional as F
+from gradcam_pp import GradCAMPP
+
+
+def loop_cam(grad, act):
+    """Previous per-image implementation: Python loop over the channels, CAM on CPU."""
+    numerator = grad.pow(2)
+    denominator = 2 * grad.pow(2) + (act * grad.pow(3)).sum((1, 2), keepdim=True)
+    alpha = numerator / (denominator + 1e-7)
+
+    weights = (alpha * F.relu(grad)).sum(dim=(1, 2))
+    cam = torch.zeros(act.shape[1:], dtype=torch.float32)
+
+    for i, w in enumerate(weights):
+        cam += w * act[i]
+
+    cam = F.relu(cam)
+    cam = cam - cam.min()
+    cam = cam / (cam.max() + 1e-7)
+
+    return cam.detach().cpu().numpy()
+
+
+def time_ms(fn, iterations):
+    fn()
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--channels", type=int, default=512)
+    parser.add_argument("--spatial", type=int, default=7, help="CAM side (7 for ResNet18 layer4 at 224px)")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    shape = (args.channels, args.spatial, args.spatial)
+
+    # numerical equivalence on CPU, where the loop implementation runs
+    grads = torch.randn(16, *shape)
+    acts = torch.relu(torch.randn(16, *shape))
+    expected = np.stack([loop_cam(grads[n], acts[n]) for n in range(16)])
+    actual = GradCAMPP.compute_cams(grads, acts).numpy()
+    max_diff = np.abs(expected - actual).max()
+    print(f"max |loop - vectorized|: {max_diff:.2e}")
+    assert np.allclose(expected, actual, atol=1e-5), "vectorized CAMs differ from the loop implementation"
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"\n{'batch':>6} {'loop ms':>10} {'vectorized ms':>14} {'speedup':>8}   ({device})")
+    for n in args.batch_sizes:
+        grads = torch.randn(n, *shape, device=device)
+        acts = torch.relu(torch.randn(n, *shape, device=device))
+        loop = time_ms(lambda: [loop_cam(grads[i].cpu(), acts[i].cpu()) for i in range(n)], args.iterations)
+        vectorized = time_ms(lambda: GradCAMPP.compute_cams(grads, acts).cpu().numpy(), args.iterations)
+        print(f"{n:>6} {loop:>10.2f} {vectorized:>14.3f} {loop / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# python -m benchmarks.benchmark_data_loading [--root ../Dataset_multi_class/Training] [--workers 0 2 4]
+#     [--images 512] [--batch-size 16] [--epochs 2]
+# Training-loader throughput (JPEG decode + the multi-class train augmentations) for
+# several worker counts, with data_loading.make_loader's pinning/prefetch settings.
+# Without --root a synthetic ImageFolder of 512x512 JPEG scans is written to a temp dir.
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+from torchvision import datasets
+from data_loading import auto_workers, loader_settings, make_loader
+from classification_multi_class.multi_class_dataset_preprocessing import train_transforms
+
+
+def make_dataset(root, images, size=512, classes=("glioma", "meningioma", "notumor", "pituitary")):
+    rng = np.random.default_rng(0)
+    for i in range(images):
+        folder = os.path.join(root, classes[i % len(classes)])
+        os.makedirs(folder, exist_ok=True)
+        scan = rng.integers(0, 256, (size, size), dtype=np.uint8)
+        Image.fromarray(scan).convert("RGB").save(os.path.join(folder, f"{i}.jpg"), quality=90)
+    return root
+
+
+def measure(dataset, batch_size, workers, epochs):
+    """(first-batch seconds, images/s per epoch) with a fresh loader, as a training run would see it."""
+    loader = make_loader(dataset, batch_size=batch_size, shuffle=True, workers=workers)
+    first_batch, rates = None, []
+    start = time.perf_counter()
+    for _ in range(epochs):
+        epoch_start = time.perf_counter()
+        for images, _ in loader:
+            if first_batch is None:
+                first_batch = time.perf_counter() - start
+        rates.append(len(dataset) / (time.perf_counter() - epoch_start))
+    del loader  # stop the persistent workers before the next setting
+    return first_batch, rates
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", type=str, default=None, help="ImageFolder root (synthetic JPEGs if omitted)")
+    parser.add_argument("--images", type=int, default=512, help="synthetic dataset size")
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="worker counts (default: 0 and auto)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--epochs", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.root or make_dataset(tmp, args.images)
+        dataset = datasets.ImageFolder(root=root, transform=train_transforms)
+        workers = args.workers if args.workers is not None else sorted({0, auto_workers()})
+        print(f"{len(dataset)} images, batch {args.batch_size}, {os.cpu_count()} CPUs, settings {loader_settings()}")
+        print(f"{'workers':>7} {'first batch s':>14} {'epoch 1 img/s':>14} {'later img/s':>12} {'speedup':>8}")
+        baseline = None
+        for n in workers:
+            first_batch, rates = measure(dataset, args.batch_size, n, args.epochs)
+            later = np.mean(rates[1:]) if len(rates) > 1 else rates[0]
+            baseline = baseline or later
+            print(f"{n:>7} {first_batch:>14.2f} {rates[0]:>14.1f} {later:>12.1f} {later / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
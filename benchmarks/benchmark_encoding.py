@@ -0,0 +1,67 @@
+# python -m benchmarks.benchmark_encoding [--image scan.png] [--sizes 512 1024]
+import argparse
+import json
+import time
+import numpy as np
+from PIL import Image
+from app.encoding import EncodingOptions, encode_visualizations
+from gradcam_pp import render_cam
+
+MODES = {
+    "png (level 6, default)": EncodingOptions(),
+    "png (level 1)": EncodingOptions(png_compress_level=1),
+    "png (level 0)": EncodingOptions(png_compress_level=0),
+    "webp q80": EncodingOptions(format="webp", quality=80),
+    "jpeg q85": EncodingOptions(format="jpeg", quality=85),
+    "png preview 256px": EncodingOptions(max_side=256),
+    "webp preview 256px": EncodingOptions(format="webp", quality=80, max_side=256),
+    "png binary (url/multipart)": EncodingOptions(delivery="url"),
+    "webp binary (url/multipart)": EncodingOptions(format="webp", quality=80, delivery="url"),
+}
+
+
+def scan_like(size, seed=0):
+    """Smooth synthetic scan: compresses like an MRI slice, unlike uniform noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] / size
+    brain = np.exp(-((x - 0.5) ** 2 + (y - 0.5) ** 2) / 0.08) * 200
+    img = np.clip(brain + rng.normal(0, 6, brain.shape), 0, 255).astype(np.uint8)
+    return np.stack([img] * 3, axis=-1)
+
+
+def payload_size(visualizations):
+    if all(isinstance(v, str) for v in visualizations.values()):
+        return len(json.dumps(visualizations))
+    return sum(len(v) for v in visualizations.values())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", type=str, default=None, help="scan to encode (synthetic if omitted)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024])
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    cam = rng.random((7, 7)).astype(np.float32)
+
+    for size in args.sizes:
+        if args.image:
+            img = np.array(Image.open(args.image).convert("RGB").resize((size, size)))
+        else:
+            img = scan_like(size)
+        arrays = {"original": img, **render_cam(img, cam)}
+
+        print(f"\n{size}x{size}: three visualizations per response")
+        print(f"{'mode':<30} {'encode ms':>10} {'payload KB':>11}")
+        for name, options in MODES.items():
+            encode_visualizations(arrays, options)  # warmup
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                encoded = encode_visualizations(arrays, options)
+            elapsed_ms = (time.perf_counter() - start) * 1000 / args.iterations
+            print(f"{name:<30} {elapsed_ms:>10.1f} {payload_size(encoded) / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# python -m benchmarks.benchmark_explain [--iterations 30] [--size 512]
+# Per-request latency of predict with the Grad-CAM++ backward (explain=True) and
+# without it (explain=False), plus the cost of the deferred explain_batch() call.
+import argparse
+from app.backends import TorchBackend
+from app.inference import explain_batch, predict
+from app.model_loader import explain_split
+from gradcam_pp import GradCAMPP
+from benchmarks.common import build_model, make_image, time_calls, summarize, default_image_path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", type=str, default=None, help="multi_class_resnet.pth (random init if omitted)")
+    parser.add_argument("--size", type=int, default=512, help="side of the synthetic scan")
+    parser.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    model, device, target_layer = build_model(args.weights)
+    backend = TorchBackend(GradCAMPP(model, target_layer), explain_split(model))
+    with open(make_image(default_image_path(), args.size), "rb") as f:
+        upload = f.read()
+
+    lazy = predict(backend, device, upload, explain=False)
+    state = lazy["explanation"]
+    item = (upload, state["state"], state["class_index"], None)
+
+    print(f"Per-request latency over {args.iterations} requests ({device}):")
+    eager = time_calls(lambda: predict(backend, device, upload), args.iterations)
+    classify_only = time_calls(lambda: predict(backend, device, upload, explain=False), args.iterations)
+    deferred = time_calls(lambda: explain_batch(backend, device, [item]), args.iterations)
+    summarize("explain=True", eager)
+    summarize("explain=False", classify_only)
+    summarize("deferred explain", deferred)
+    print(f"p50 speedup of the classification-only path: {sorted(eager)[len(eager) // 2] / sorted(classify_only)[len(classify_only) // 2]:.2f}x")
+    backend.close()
+
+
+if __name__ == "__main__":
+    main()
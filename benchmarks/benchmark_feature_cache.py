@@ -0,0 +1,80 @@
+# python -m benchmarks.benchmark_feature_cache [--images 256] [--epochs 3] [--batch-size 16]
+# layer4 + fc fine-tuning as in train_multi_class_resnet.py: epoch time with the full
+# forward through the frozen conv1..layer3 vs training from the feature_cache fp16
+# layer3 features (DATA_FEATURE_CACHE=1), plus the one-time cache build and the logit
+# drift the fp16 storage introduces. Images are synthetic tensors, so decoding is excluded.
+import argparse
+import os
+import tempfile
+import time
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import TensorDataset
+from data_loading import make_loader
+from feature_cache import FeatureDataset, ResNetHead, build_feature_cache, resnet_trunk
+from benchmarks.common import build_model
+
+
+def train_epoch(forward, model, loader, optimizer, criterion):
+    model.train()
+    start = time.perf_counter()
+    for images, labels in loader:
+        optimizer.zero_grad()
+        loss = criterion(forward(images), labels)
+        loss.backward()
+        optimizer.step()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=256)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    generator = torch.Generator().manual_seed(0)
+    dataset = TensorDataset(torch.randn(args.images, 3, 224, 224, generator=generator),
+                            torch.randint(0, 4, (args.images,), generator=generator))
+
+    model, device, _ = build_model()
+    for param in model.parameters():
+        param.requires_grad = False
+    for param in [*model.layer4.parameters(), *model.fc.parameters()]:
+        param.requires_grad = True
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam([*model.layer4.parameters(), *model.fc.parameters()], lr=1e-4)
+
+    loader = make_loader(dataset, batch_size=args.batch_size, shuffle=True, workers=0)
+    full = [train_epoch(model, model, loader, optimizer, criterion) for _ in range(args.epochs)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        path = build_feature_cache(resnet_trunk(model), dataset, os.path.join(tmp, "features.npy"), device)
+        build_seconds = time.perf_counter() - start
+        features = FeatureDataset(path)
+        head = ResNetHead(model)
+        cached_loader = make_loader(features, batch_size=args.batch_size, shuffle=True, workers=0)
+        cached = [train_epoch(head, model, cached_loader, optimizer, criterion) for _ in range(args.epochs)]
+
+        model.eval()
+        with torch.no_grad():
+            images = dataset.tensors[0][:args.batch_size]
+            reference = model(images)
+            from_cache = head(torch.stack([features[i][0] for i in range(len(images))]))
+        drift = (reference - from_cache).abs().max().item()
+
+    full_epoch, cached_epoch = sum(full) / len(full), sum(cached) / len(cached)
+    print(f"{args.images} images, batch {args.batch_size}, {torch.get_num_threads()} threads; "
+          f"cache build {build_seconds:.1f}s; eval logit drift from fp16 features {drift:.2e}")
+    print(f"  full forward (frozen trunk)   {full_epoch:7.2f} s/epoch")
+    print(f"  cached layer3 features        {cached_epoch:7.2f} s/epoch  {full_epoch / cached_epoch:5.2f}x")
+    print(f"  break-even after {build_seconds / max(full_epoch - cached_epoch, 1e-9):.1f} epochs")
+
+
+if __name__ == "__main__":
+    main()
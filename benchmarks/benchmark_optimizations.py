@@ -0,0 +1,66 @@
+# python -m benchmarks.benchmark_optimizations [--modes fuse channels_last bf16 fuse,channels_last,bf16 compile]
+#     [--batch-sizes 1 8] [--weights multi_class_resnet.pth]
+# Latency of each MODEL_OPTIMIZATIONS setting (app.model_loader.optimize_model) against
+# the FP32 eager model, with the probability and Grad-CAM++ drift it introduces.
+# "compile" needs a long first call per batch size; it is excluded from the timings.
+import argparse
+import copy
+import numpy as np
+import torch
+from app.backends import TorchBackend
+from app.model_loader import OPTIMIZATIONS, optimize_model, validation_batch
+from gradcam_pp import GradCAMPP
+from benchmarks.common import build_model, time_calls
+
+
+def parse_mode(mode):
+    names = [] if mode == "fp32" else mode.split(",")
+    unknown = set(names) - set(OPTIMIZATIONS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown optimizations {sorted(unknown)}; choose from {list(OPTIMIZATIONS)}")
+    return mode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", type=parse_mode, nargs="+",
+                        default=["fuse", "channels_last", "bf16", "fuse,channels_last,bf16"],
+                        help="comma-separated optimizations per mode; the fp32 baseline always runs")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--weights", type=str, default=None, help="multi_class_resnet.pth (random init if omitted)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    # image-like inputs: on noise the softmax saturates and hides the drift
+    inputs = {n: validation_batch(n) for n in args.batch_sizes}
+    # one FP32 network; every mode optimizes its own copy, so the drift columns compare like with like
+    base_model, device, _ = build_model(args.weights)
+
+    print(f"{'mode':<28} {'batch':>5} {'classify ms':>12} {'speedup':>8} {'+ Grad-CAM ms':>14} {'speedup':>8} "
+          f"{'max |dprob|':>12} {'top-1 agree':>12} {'max |dcam|':>11}")
+    reference = {}
+    for mode in ["fp32", *args.modes]:
+        model = copy.deepcopy(base_model)
+        target_layer = model.layer4[-1].conv2
+        if mode != "fp32":
+            optimize_model(model, target_layer, mode.split(","), tolerance=float("inf"))
+        backend = TorchBackend(GradCAMPP(model, target_layer))
+        for n, x in inputs.items():
+            logits, cams, _ = backend.infer(x)
+            probs = torch.softmax(torch.from_numpy(logits).float(), dim=1).numpy()
+            classify = time_calls(lambda: backend.classify(x), args.iterations).mean()
+            full = time_calls(lambda: backend.infer(x), args.iterations).mean()
+            if mode == "fp32":
+                reference[n] = probs, cams, classify, full
+            ref_probs, ref_cams, ref_classify, ref_full = reference[n]
+            print(f"{mode:<28} {n:>5} {classify:>12.2f} {ref_classify / classify:>7.2f}x {full:>14.2f} "
+                  f"{ref_full / full:>7.2f}x {np.abs(probs - ref_probs).max():>12.2e} "
+                  f"{(probs.argmax(1) == ref_probs.argmax(1)).mean():>12.0%} {np.abs(cams - ref_cams).max():>11.2e}")
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# python -m benchmarks.benchmark_packed_dataset [--root ../Dataset_multi_class/Training] [--images 512]
+#     [--workers 0] [--epochs 3]
+# Data-loading time per training epoch for the multi-class pipeline: JPEG ImageFolder with
+# the PIL train transforms vs the dataset_pack memmap with packed_train_transforms (only
+# the random augmentations run online). Also reports the one-time packing cost.
+# Without --root a synthetic ImageFolder of 512x512 JPEG scans is written to a temp dir.
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from torchvision import datasets
+from data_loading import make_loader
+from dataset_pack import PackedDataset, pack_image_folder
+from classification_multi_class.multi_class_dataset_preprocessing import packed_train_transforms, train_transforms
+from benchmarks.benchmark_data_loading import make_dataset
+
+
+def epoch_times(dataset, batch_size, workers, epochs):
+    loader = make_loader(dataset, batch_size=batch_size, shuffle=True, workers=workers)
+    times = []
+    for _ in range(epochs):
+        start = time.perf_counter()
+        for _ in loader:
+            pass
+        times.append(time.perf_counter() - start)
+    del loader
+    return np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", type=str, default=None, help="ImageFolder root (synthetic JPEGs if omitted)")
+    parser.add_argument("--images", type=int, default=512, help="synthetic dataset size")
+    parser.add_argument("--size", type=int, default=224)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--epochs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.root or make_dataset(os.path.join(tmp, "images"), args.images)
+        start = time.perf_counter()
+        path = pack_image_folder(root, args.size, os.path.join(tmp, "pack.npy"))
+        pack_seconds = time.perf_counter() - start
+
+        folder = datasets.ImageFolder(root=root, transform=train_transforms)
+        packed = PackedDataset(path, packed_train_transforms)
+        results = {
+            "ImageFolder + PIL transforms": epoch_times(folder, args.batch_size, args.workers, args.epochs),
+            "pack + tensor augmentations": epoch_times(packed, args.batch_size, args.workers, args.epochs),
+        }
+        print(f"{len(folder)} images, {args.workers} workers, batch {args.batch_size}; "
+              f"packing took {pack_seconds:.1f}s ({os.path.getsize(path) / 1e6:.0f} MB)")
+        baseline = results["ImageFolder + PIL transforms"].mean()
+        for name, times in results.items():
+            print(f"  {name:<30} {times.mean():7.2f} s/epoch  {len(folder) / times.mean():8.1f} img/s  "
+                  f"{baseline / times.mean():5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# python -m benchmarks.benchmark_predict [--image scan.png] [--weights model.pth]
+import argparse
+import base64
+from io import BytesIO
+import numpy as np
+import torch
+from PIL import Image
+from app.backends import TorchBackend
+from app.inference import predict, transform
+from gradcam_pp import GradCAMPP, run_gradcam
+from benchmarks.common import build_model, make_image, time_calls, summarize, default_image_path
+
+
+def _encode_png(arr):
+    buf = BytesIO()
+    Image.fromarray(arr).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
+
+
+def legacy_predict(model, device, image_path, target_layer):
+    """Two-pass path: no-grad forward for probs, then a second forward+backward in run_gradcam."""
+    image = transform(Image.open(image_path).convert("RGB")).unsqueeze(0).to(device)
+    with torch.no_grad():
+        probs = torch.softmax(model(image), dim=1).cpu().numpy()[0]
+    heatmap, bbox = run_gradcam(model, device, image_path, target_layer)
+    original = np.array(Image.open(image_path).convert("RGB"))
+    return probs, [_encode_png(a) for a in (heatmap, bbox, original)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", type=str, default=None, help="MRI scan to run (synthetic if omitted)")
+    parser.add_argument("--weights", type=str, default=None, help="multi_class_resnet.pth (random init if omitted)")
+    parser.add_argument("--size", type=int, default=512, help="side of the synthetic scan")
+    parser.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    model, device, target_layer = build_model(args.weights)
+    backend = TorchBackend(GradCAMPP(model, target_layer))
+    image_path = args.image or make_image(default_image_path(), args.size)
+
+    # sanity check: both paths agree on the prediction
+    legacy_probs, _ = legacy_predict(model, device, image_path, target_layer)
+    fused = predict(backend, device, image_path)
+    fused_probs = np.array(list(fused["all_probabilities"].values()))
+    print(f"max |probs difference|: {np.abs(legacy_probs - fused_probs).max():.2e}")
+
+    print(f"\nPer-request latency over {args.iterations} requests ({device}):")
+    before = time_calls(lambda: legacy_predict(model, device, image_path, target_layer), args.iterations)
+    after = time_calls(lambda: predict(backend, device, image_path), args.iterations)
+    summarize("before (two-pass)", before)
+    summarize("after (fused single pass)", after)
+    print(f"speedup (mean): {before.mean() / after.mean():.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# python -m benchmarks.benchmark_render [--sizes 512 1024] [--batch-size 8]
+# Heatmap + bounding box rendering per image: the previous float32 implementation
+# (two CAM resizes, float blends, one box over the full-resolution mask) against
+# gradcam_pp.render_cam, which boxes each cam_regions() region separately.
+import argparse
+import numpy as np
+from PIL import Image
+from gradcam_pp import _JET_CMAP, cam_regions, render_cam, render_cams
+from benchmarks.common import time_calls
+
+
+def _legacy_resize_cam(cam, out_h, out_w):
+    cam_uint8 = (np.clip(cam, 0, 1) * 255).astype(np.uint8)
+    pil = Image.fromarray(cam_uint8).resize((out_w, out_h), Image.BILINEAR)
+    return np.array(pil, dtype=np.float32) / 255.0
+
+
+def legacy_render(img, cam, threshold=0.5):
+    """overlay_heatmap() + draw_bounding_box() as they were before render_cam()."""
+    resized = _legacy_resize_cam(cam, *img.shape[:2])
+    heatmap = _JET_CMAP[(resized * 255).astype(np.uint8)]
+    blended = np.clip(img.astype(np.float32) * 0.6 + heatmap.astype(np.float32) * 0.4, 0, 255).astype(np.uint8)
+
+    resized = _legacy_resize_cam(cam, *img.shape[:2])
+    rows, cols = np.where(resized > threshold)
+    boxed = img.copy()
+    if rows.size:
+        y_min, y_max, x_min, x_max = rows.min(), rows.max(), cols.min(), cols.max()
+        boxed[y_min:y_min + 2, x_min:x_max + 1] = (0, 255, 0)
+        boxed[y_max - 1:y_max + 1, x_min:x_max + 1] = (0, 255, 0)
+        boxed[y_min:y_max + 1, x_min:x_min + 2] = (0, 255, 0)
+        boxed[y_min:y_max + 1, x_max - 1:x_max + 1] = (0, 255, 0)
+    return {"heatmap": blended, "bounding_box": boxed}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.batch_size
+    for size in args.sizes:
+        images = [rng.integers(0, 256, (size, size, 3), dtype=np.uint8) for _ in range(n)]
+        # smooth 7x7 maps like the ResNet's layer4 produces
+        cams = [np.outer(np.hanning(9)[1:-1], np.hanning(9)[1:-1]) * rng.uniform(0.6, 1.0) for _ in range(n)]
+
+        legacy = [legacy_render(img, cam) for img, cam in zip(images, cams)]
+        current = render_cams(images, cams)
+        diff = max(np.abs(a["heatmap"].astype(int) - b["heatmap"].astype(int)).max()
+                   for a, b in zip(legacy, current))
+
+        per_image = {
+            "legacy (float32, 2 resizes)": time_calls(lambda: [legacy_render(i, c) for i, c in zip(images, cams)],
+                                                      args.iterations) / n,
+            "render_cam": time_calls(lambda: [render_cam(i, c) for i, c in zip(images, cams)], args.iterations) / n,
+            "  of which cam_regions": time_calls(lambda: [cam_regions(c, i.shape[:2]) for i, c in zip(images, cams)],
+                                                 args.iterations) / n,
+            "render_cam + contour + mask": time_calls(
+                lambda: [render_cam(i, c, outputs=("heatmap", "bounding_box", "contour", "mask"))
+                         for i, c in zip(images, cams)], args.iterations) / n,
+        }
+        baseline = per_image["legacy (float32, 2 resizes)"].mean()
+        print(f"{size}x{size}, heatmap + bounding box, ms per image (max heatmap pixel difference to legacy: {diff}):")
+        for name, latencies in per_image.items():
+            speedup = "" if name.startswith(" ") else f"{baseline / latencies.mean():5.2f}x"
+            print(f"  {name:<30} {latencies.mean():8.2f} ms   {speedup}")
+
+
+if __name__ == "__main__":
+    main()
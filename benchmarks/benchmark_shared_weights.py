@@ -0,0 +1,69 @@
+# python -m benchmarks.benchmark_shared_weights --weights multi_class_resnet.pth [--workers 4] \
+#     [--models unet=best_unet_model.pth binary_cnn=binary_cnn_v2.pth]
+# Memory per worker process with private weight copies vs weights shared through
+# the mmapped file (MODEL_SHARE_WEIGHTS), measured while all workers are alive.
+# The ResNet weights must be a zip-format state dict, e.g. the copy in MODEL_STORE_DIR.
+import argparse
+import multiprocessing
+import numpy as np
+import torch
+
+
+def worker(weights, models, share, barrier, queue):
+    from app.model_loader import build_resnet, load_weights
+    from app.model_registry import SPECS, model_memory, process_memory
+
+    torch.set_num_threads(1)
+    before = process_memory()
+    loaded = [load_weights(build_resnet, weights, share)]
+    loaded += [load_weights(SPECS[name].build, path, share) for name, path in models]
+    weight_bytes = 0
+    for model in loaded:
+        model.eval()
+        memory = model_memory(model)
+        weight_bytes += memory["parameter_bytes"] + memory["buffer_bytes"]
+    # serve a request so every weight page is actually touched
+    with torch.no_grad():
+        loaded[0](torch.zeros(1, 3, 224, 224))
+        for (name, _), model in zip(models, loaded[1:]):
+            size = 256 if SPECS[name].preprocessing == "unit_256" else 224
+            channels = 1 if SPECS[name].preprocessing == "gray_224" else 3
+            model(torch.zeros(1, channels, size, size))
+    barrier.wait()  # PSS splits shared pages between the processes mapping them right now
+    after = process_memory()
+    queue.put((weight_bytes, {k: after[k] - before[k] for k in after}))
+    barrier.wait()
+
+
+def measure(weights, models, share, workers):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    queue = context.Queue()
+    processes = [context.Process(target=worker, args=(weights, models, share, barrier, queue)) for _ in range(workers)]
+    for p in processes:
+        p.start()
+    results = [queue.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return results[0][0], {k: np.mean([r[1][k] for r in results]) for k in results[0][1]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", required=True, help="ResNet state dict (zip format, e.g. from MODEL_STORE_DIR)")
+    parser.add_argument("--models", nargs="*", default=[], help="registry models as name=weights.pth")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    models = [tuple(m.split("=", 1)) for m in args.models]
+
+    mb = 1024 * 1024
+    print(f"{args.workers} workers; growth per worker after loading and one forward pass (MB):")
+    print(f"{'weights':<9} {'model MB':>9} {'RSS':>8} {'PSS':>8} {'private':>8} {'total PSS':>10}")
+    for share in (False, True):
+        weight_bytes, growth = measure(args.weights, models, share, args.workers)
+        print(f"{'shared' if share else 'private':<9} {weight_bytes / mb:>9.1f} {growth['rss'] / mb:>8.1f} "
+              f"{growth['pss'] / mb:>8.1f} {growth['private'] / mb:>8.1f} {growth['pss'] * args.workers / mb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
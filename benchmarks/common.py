@@ -0,0 +1,49 @@
+import os
+import tempfile
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from torchvision import models
+from PIL import Image
+
+
+def build_model(weights=None, device=None):
+    """4-class ResNet18 as served by the API; random weights unless a .pth is given."""
+    device = device or torch.device("cpu")
+    model = models.resnet18(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, 4)
+    if weights:
+        model.load_state_dict(torch.load(weights, map_location=device))
+    model.to(device)
+    model.eval()
+    return model, device, model.layer4[-1].conv2
+
+
+def make_image(path, size=512, seed=0):
+    """Write a synthetic grayscale-like RGB scan to `path` and return the path."""
+    rng = np.random.default_rng(seed)
+    arr = rng.integers(0, 256, (size, size), dtype=np.uint8)
+    Image.fromarray(arr).convert("RGB").save(path)
+    return path
+
+
+def time_calls(fn, iterations, warmup=2):
+    """Run fn() `iterations` times after warmup; return per-call latencies in ms."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def summarize(name, latencies):
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{name:<28} mean {latencies.mean():8.2f} ms   p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+
+
+def default_image_path():
+    return os.path.join(tempfile.gettempdir(), "brainet_benchmark_scan.png")
@@ -0,0 +1,91 @@
+# python -m benchmarks.evaluate_cascade --test-dir Dataset_multi_class/Testing \
+#     --weights multi_class_resnet.pth --screen binary_cnn --screen-weights binary_cnn_v2.pth \
+#     [--thresholds 0.05 0.1 0.2 0.3 0.5]
+# Accuracy and cost of the cascade (app.cascade) against the full ResNet + Grad-CAM++
+# path on an ImageFolder test set whose class folders match app.inference.CLASS_NAMES.
+import argparse
+import os
+import time
+import numpy as np
+import torch
+from app.backends import ONNX_MODELS, TorchBackend, create_backend
+from app.cascade import CASCADE_SCREENS, BackendScreen, ModelScreen
+from app.inference import CLASS_NAMES, decode_image, transform
+from gradcam_pp import GradCAMPP
+from benchmarks.common import build_model
+
+
+def list_test_set(test_dir, limit=None):
+    paths, labels = [], []
+    for label, name in enumerate(CLASS_NAMES):
+        class_dir = os.path.join(test_dir, name)
+        for f in sorted(os.listdir(class_dir)):
+            if f.lower().endswith((".png", ".jpg", ".jpeg")):
+                paths.append(os.path.join(class_dir, f))
+                labels.append(label)
+    order = np.random.default_rng(0).permutation(len(paths))[:limit]
+    return [paths[i] for i in order], np.array(labels)[order]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--test-dir", default="Dataset_multi_class/Testing")
+    parser.add_argument("--weights", required=True, help="multi_class_resnet.pth")
+    parser.add_argument("--screen", required=True, choices=CASCADE_SCREENS)
+    parser.add_argument("--screen-weights", default=None, help="weights for binary_cnn / binary_resnet")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.05, 0.1, 0.2, 0.3, 0.5])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=None, help="evaluate a random subset")
+    args = parser.parse_args()
+
+    model, device, target_layer = build_model(args.weights)
+    backend = TorchBackend(GradCAMPP(model, target_layer))
+    if args.screen in ONNX_MODELS:
+        screen = BackendScreen(create_backend(args.screen, backend.grad_cam_pp))
+    else:
+        screen = ModelScreen(args.screen, args.screen_weights, device)
+
+    paths, labels = list_test_set(args.test_dir, args.limit)
+    tumor_probs, full_preds = [], []
+    screen_seconds = full_seconds = 0.0
+    for start in range(0, len(paths), args.batch_size):
+        images = [decode_image(p) for p in paths[start:start + args.batch_size]]
+        batch = torch.stack([transform(image) for image in images]).to(device)
+
+        t0 = time.perf_counter()
+        tumor_probs.append(screen.tumor_probability(images, batch))
+        t1 = time.perf_counter()
+        logits, _, _ = backend.infer(batch)  # classification + Grad-CAM++, as served
+        t2 = time.perf_counter()
+        full_preds.append(logits.argmax(axis=1))
+        screen_seconds += t1 - t0
+        full_seconds += t2 - t1
+    backend.close()
+
+    tumor_probs = np.concatenate(tumor_probs)
+    full_preds = np.concatenate(full_preds)
+    notumor = CLASS_NAMES.index("notumor")
+    is_tumor = labels != notumor
+    screen_ms = screen_seconds * 1000 / len(paths)
+    full_ms = full_seconds * 1000 / len(paths)
+
+    def report(name, preds, escalated, cost_ms):
+        accuracy = (preds == labels).mean()
+        missed = ((preds == notumor) & is_tumor).sum()
+        recall = 1 - missed / max(is_tumor.sum(), 1)
+        print(f"{name:<14} {accuracy:>9.2%} {recall:>13.2%} {missed:>7} {escalated:>10.1%} "
+              f"{cost_ms:>11.1f} {1 - cost_ms / full_ms:>7.1%}")
+
+    print(f"{len(paths)} images, {is_tumor.mean():.1%} with a tumor; screen {args.screen}: "
+          f"{screen_ms:.1f} ms/image, full path: {full_ms:.1f} ms/image ({device})\n")
+    print(f"{'':<14} {'accuracy':>9} {'tumor recall':>13} {'missed':>7} {'escalated':>10} "
+          f"{'ms / image':>11} {'saved':>7}")
+    report("full", full_preds, 1.0, full_ms)
+    for threshold in args.thresholds:
+        escalated = tumor_probs >= threshold
+        preds = np.where(escalated, full_preds, notumor)
+        report(f"cascade @{threshold:g}", preds, escalated.mean(), screen_ms + escalated.mean() * full_ms)
+
+
+if __name__ == "__main__":
+    main()
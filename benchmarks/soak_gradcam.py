@@ -0,0 +1,56 @@
+# python -m benchmarks.soak_gradcam [--requests 5000] [--window 500] [--threads 4]
+import argparse
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.backends import TorchBackend
+from app.inference import predict
+from gradcam_pp import GradCAMPP
+from benchmarks.common import build_model, make_image, default_image_path
+
+
+def hook_count(module):
+    return len(module._forward_hooks) + len(module._backward_hooks)
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--window", type=int, default=500, help="requests per reported window")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent callers sharing one engine")
+    parser.add_argument("--size", type=int, default=256, help="side of the synthetic scan")
+    parser.add_argument("--weights", type=str, default=None)
+    args = parser.parse_args()
+
+    model, device, target_layer = build_model(args.weights)
+    with open(make_image(default_image_path(), args.size), "rb") as f:
+        upload = f.read()
+    grad_cam_pp = GradCAMPP(model, target_layer)
+    backend = TorchBackend(grad_cam_pp)
+
+    def one_request(_):
+        start = time.perf_counter()
+        predict(backend, device, upload)
+        return (time.perf_counter() - start) * 1000
+
+    print(f"{'requests':>9} {'p50 ms':>9} {'p99 ms':>9} {'hooks':>6} {'max RSS MB':>11}")
+    first_p50 = None
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        for done in range(0, args.requests, args.window):
+            latencies = np.array(list(pool.map(one_request, range(args.window))))
+            p50, p99 = np.percentile(latencies, [50, 99])
+            first_p50 = first_p50 or p50
+            print(f"{done + args.window:>9} {p50:>9.2f} {p99:>9.2f} {hook_count(target_layer):>6} {max_rss_mb():>11.1f}")
+
+    grad_cam_pp.detach()
+    print(f"\nhooks after detach: {hook_count(target_layer)}")
+    print(f"last/first window p50 ratio: {p50 / first_p50:.2f}")
+
+
+if __name__ == "__main__":
+    main()
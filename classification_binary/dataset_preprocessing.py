@@ -1,6 +1,12 @@
 import os
+import sys
+import torch
 from torchvision import datasets, transforms
-from torch.utils.data import DataLoader
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # repo root
+from data_loading import make_loader, loader_settings
+from dataset_pack import DATA_PACKED, open_image_folder_pack
+from batch_augment import DATA_BATCH_AUGMENT, BatchAugment
 
 # === directories ===
 train_dir = 'Dataset_binary/Training'
@@ -21,21 +27,55 @@ test_transforms = transforms.Compose([
     transforms.Normalize([0.5], [0.5])
 ])
 
+# DATA_PACKED=1: images come from the pack already resized, as uint8 CHW tensors,
+# so only the random augmentations run per epoch
+packed_train_transforms = transforms.Compose([
+    transforms.RandomHorizontalFlip(p=0.5),
+    transforms.RandomRotation(10),
+    transforms.ConvertImageDtype(torch.float),
+    transforms.Normalize([0.5], [0.5])
+])
+
+packed_test_transforms = transforms.Compose([
+    transforms.ConvertImageDtype(torch.float),
+    transforms.Normalize([0.5], [0.5])
+])
+
+# DATA_BATCH_AUGMENT=1: the train loader yields resized uint8 batches and the
+# training script applies augment_batch to them on the device
+batch_train_transforms = transforms.Compose([
+    transforms.Resize((224,224)),
+    transforms.PILToTensor()
+])
+
+augment_batch = BatchAugment(flip_p=0.5, degrees=10, mean=[0.5], std=[0.5]) if DATA_BATCH_AUGMENT else None
+
 # === datasets ===
-train_dataset = datasets.ImageFolder(root=train_dir, transform=train_transforms)
-test_dataset = datasets.ImageFolder(root=test_dir, transform=test_transforms)
+# (train_eval_dataset: the training images without augmentation, e.g. for the feature cache)
+if DATA_PACKED:
+    train_dataset = open_image_folder_pack(train_dir, 224, None if DATA_BATCH_AUGMENT else packed_train_transforms)
+    test_dataset = open_image_folder_pack(test_dir, 224, packed_test_transforms)
+    train_eval_dataset = open_image_folder_pack(train_dir, 224, packed_test_transforms)
+else:
+    train_dataset = datasets.ImageFolder(root=train_dir,
+                                         transform=batch_train_transforms if DATA_BATCH_AUGMENT else train_transforms)
+    test_dataset = datasets.ImageFolder(root=test_dir, transform=test_transforms)
+    train_eval_dataset = datasets.ImageFolder(root=train_dir, transform=test_transforms)
 
 # === data loaders ===
-train_loader = DataLoader(train_dataset, batch_size=16, shuffle=True)
-test_loader = DataLoader(test_dataset, batch_size=16, shuffle=False)
+train_loader = make_loader(train_dataset, batch_size=16, shuffle=True)
+test_loader = make_loader(test_dataset, batch_size=16, shuffle=False)
 
 # === quick check ===
 print(f"Number of training samples: {len(train_dataset)}")
 print(f"Number of testing samples: {len(test_dataset)}")
 print(f"Classes: {train_dataset.classes}")
+print(f"Data loading: {loader_settings()}")
 
 # === example of iterating through a batch ===
-for images, labels in train_loader:
-    print(f"Batch image shape: {images.shape}")
-    print(f"Batch labels: {labels}")
-    break
\ No newline at end of file
+# (only when run directly: on import it would start the loader's workers for nothing)
+if __name__ == "__main__":
+    for images, labels in train_loader:
+        print(f"Batch image shape: {images.shape}")
+        print(f"Batch labels: {labels}")
+        break
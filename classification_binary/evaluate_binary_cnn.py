@@ -16,7 +16,7 @@ model.eval()
 all_preds, all_lables = [], []
 with torch.no_grad():
     for images, lables in test_loader:
-        images, lables = images.to(device), lables.to(device)
+        images, lables = images.to(device, non_blocking=True), lables.to(device, non_blocking=True)
         outputs = model(images)
         preds = (torch.sigmoid(outputs) > 0.5).int()
         all_preds.extend(preds.cpu().numpy())
@@ -24,7 +24,7 @@ all_preds, all_labels, all_probs = [], [], []
 
 with torch.no_grad():
     for images, labels in test_loader:
-        images, labels = images.to(device), labels.to(device)
+        images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True)
         outputs = model(images)
         probs = torch.sigmoid(outputs).squeeze()
         preds = (probs > 0.5).int()
@@ -20,7 +20,7 @@ model.eval()
 all_preds, all_labels = [], []
 with torch.no_grad():
     for images, labels in test_loader:
-        images, labels = images.to(device), labels.to(device)
+        images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True)
         outputs = model(images)
         preds = (torch.sigmoid(outputs) > 0.5).int()
         all_preds.extend(preds.cpu().numpy())
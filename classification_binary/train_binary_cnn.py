@@ -2,7 +2,7 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 import matplotlib.pyplot as plt
-from dataset_preprocessing import train_loader, test_loader
+from dataset_preprocessing import train_loader, test_loader, augment_batch
 from binary_cnn_model import SimpleCNN
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -20,7 +20,9 @@ for epoch in range(num_epochs):
     model.train()
     running_loss = 0.0
     for images, labels in train_loader:
-        images, labels = images.to(device), labels.float().unsqueeze(1).to(device)
+        images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True).float().unsqueeze(1)
+        if augment_batch is not None:
+            images = augment_batch(images)
         optimizer.zero_grad()
         outputs = model(images)
         loss = criterion(outputs, labels)
@@ -35,7 +37,7 @@ for epoch in range(num_epochs):
     correct, total = 0, 0
     with torch.no_grad():
         for images, labels in test_loader:
-            images, labels = images.to(device), labels.to(device)
+            images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True)
             outputs = model(images)
             preds = torch.sigmoid(outputs) > 0.5
             correct += (preds.squeeze() == labels).sum().item()
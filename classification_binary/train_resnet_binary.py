@@ -3,7 +3,8 @@ import torch.nn as nn
 import torch.optim as optim
 import matplotlib.pyplot as plt
 from torchvision import models
-from dataset_preprocessing import train_loader, test_loader
+import dataset_preprocessing as data
+from feature_cache import DATA_FEATURE_CACHE, FEATURE_CACHE_VIEWS, ResNetHead, feature_loader
 import time
 
 # === device setup ===
@@ -23,6 +24,21 @@ for param in model.layer4.parameters():
 for param in model.fc.parameters():
     param.requires_grad = True
 
+# === frozen-trunk feature cache (DATA_FEATURE_CACHE=1) ===
+# conv1..layer3 run once per image (and view) instead of every epoch; training and
+# validation then run only layer4 + fc on the cached layer3 features
+forward = model
+augment_batch = data.augment_batch
+if DATA_FEATURE_CACHE:
+    source = data.train_dataset if FEATURE_CACHE_VIEWS else data.train_eval_dataset
+    train_loader = feature_loader(model, "binary_train", source, device, batch_size=16,
+                                  views=FEATURE_CACHE_VIEWS, augment=augment_batch, shuffle=True)
+    test_loader = feature_loader(model, "binary_test", data.test_dataset, device, batch_size=16)
+    augment_batch = None
+    forward = ResNetHead(model)
+else:
+    train_loader, test_loader = data.train_loader, data.test_loader
+
 # === loss and optimizer ===
 criterion = nn.BCEWithLogitsLoss()
 optimizer = optim.Adam(
@@ -44,9 +60,11 @@ for epoch in range(num_epochs):
     model.train()
     running_loss = 0.0
     for images, labels in train_loader:
-        images, labels = images.to(device), labels.float().unsqueeze(1).to(device)
+        images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True).float().unsqueeze(1)
+        if augment_batch is not None:
+            images = augment_batch(images)
         optimizer.zero_grad()
-        outputs = model(images)
+        outputs = forward(images)
         loss = criterion(outputs, labels)
         loss.backward()
         optimizer.step()
@@ -59,8 +77,8 @@ for epoch in range(num_epochs):
     correct, total = 0, 0
     with torch.no_grad():
         for images, labels in test_loader:
-            images, labels = images.to(device), labels.to(device)
-            outputs = model(images)
+            images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True)
+            outputs = forward(images)
             preds = torch.sigmoid(outputs) > 0.5
             correct += (preds.squeeze() == labels).sum().item()
             total += labels.size(0)
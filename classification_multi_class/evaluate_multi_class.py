@@ -32,7 +32,7 @@ model.eval()
 all_preds, all_labels = [], []
 with torch.no_grad():
     for images, labels in test_loader:
-        images, labels = images.to(device), labels.to(device)
+        images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True)
         outputs = model(images)
         _, preds = torch.max(outputs, 1)
         all_preds.extend(preds.cpu().numpy())
@@ -1,8 +1,15 @@
-import torch
 import os
-from torchvision import datasets, transforms
-from torch.utils.data import DataLoader, WeightedRandomSampler
+import sys
+import functools
+import torch
 import numpy as np
+from torchvision import datasets, transforms
+from torch.utils.data import WeightedRandomSampler
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # repo root
+from data_loading import make_loader, loader_settings
+from dataset_pack import DATA_PACKED, open_image_folder_pack
+from batch_augment import DATA_BATCH_AUGMENT, BatchAugment
 
 # === directories ===
 train_dir = '../Dataset_multi_class/Training'
@@ -24,32 +31,127 @@ test_transforms = transforms.Compose([
     transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
 ])
 
+# DATA_PACKED=1: images come from the pack already resized, as uint8 CHW tensors,
+# so only the random augmentations run per epoch
+packed_train_transforms = transforms.Compose([
+    transforms.RandomHorizontalFlip(p=0.5),
+    transforms.RandomRotation(10),
+    transforms.ColorJitter(brightness=0.2, contrast=0.2),
+    transforms.ConvertImageDtype(torch.float),
+    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+])
+
+packed_test_transforms = transforms.Compose([
+    transforms.ConvertImageDtype(torch.float),
+    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+])
+
+# DATA_BATCH_AUGMENT=1: the train loader yields resized uint8 batches and the
+# training script applies augment_batch to them on the device
+batch_train_transforms = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.PILToTensor()
+])
+
+augment_batch = BatchAugment(flip_p=0.5, degrees=10, brightness=0.2, contrast=0.2,
+                             mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]) if DATA_BATCH_AUGMENT else None
+
+# Everything below is built on first use and cached, so importing this module
+# neither scans the dataset folders nor touches an image:
+#   from multi_class_dataset_preprocessing import train_loader, test_loader, class_weights
+# still works through the module __getattr__ at the bottom.
+
+
 # === datasets ===
-train_dataset = datasets.ImageFolder(root=train_dir, transform=train_transforms)
-test_dataset = datasets.ImageFolder(root=test_dir, transform=test_transforms)
+@functools.cache
+def get_train_dataset():
+    if DATA_PACKED:
+        return open_image_folder_pack(train_dir, 224, None if DATA_BATCH_AUGMENT else packed_train_transforms)
+    return datasets.ImageFolder(root=train_dir, transform=batch_train_transforms if DATA_BATCH_AUGMENT else train_transforms)
+
+
+@functools.cache
+def get_train_eval_dataset():
+    """Training images with the test transforms (no augmentation), e.g. for the feature cache."""
+    if DATA_PACKED:
+        return open_image_folder_pack(train_dir, 224, packed_test_transforms)
+    return datasets.ImageFolder(root=train_dir, transform=test_transforms)
+
+
+@functools.cache
+def get_test_dataset():
+    if DATA_PACKED:
+        return open_image_folder_pack(test_dir, 224, packed_test_transforms)
+    return datasets.ImageFolder(root=test_dir, transform=test_transforms)
+
+
+# === class weights for imbalanced data ===
+def count_classes(dataset):
+    """Images per class, in `dataset.classes` order, read from the ImageFolder
+    (or pack) target index; no image is decoded."""
+    return np.bincount(dataset.targets, minlength=len(dataset.classes))
+
+
+@functools.cache
+def get_class_counts():
+    return count_classes(get_train_dataset()).tolist()
+
 
-# === calculate class weights for imbalanced data ===
-class_counts = []
-for root, dirs, files in os.walk(train_dir):
-    if not dirs:  # leaf directory
-        class_counts.append(len(files))
+@functools.cache
+def get_class_weights():
+    class_weights = 1. / torch.tensor(get_class_counts(), dtype=torch.float)
+    print(f"Class counts: {dict(zip(get_train_dataset().classes, get_class_counts()))}")
+    print(f"Class weights: {class_weights}")
+    return class_weights
 
-class_weights = 1. / torch.tensor(class_counts, dtype=torch.float)
-print(f"Class counts: {class_counts}")
-print(f"Class weights: {class_weights}")
 
-# === create weighted sampler ===
-sample_weights = [0] * len(train_dataset)
-for idx, (data, label) in enumerate(train_dataset):
-    sample_weights[idx] = class_weights[label]
+# === weighted sampler ===
+@functools.cache
+def get_sample_weights():
+    """Per-image sampling weight: the weight of its class, gathered over the targets."""
+    return get_class_weights()[torch.as_tensor(get_train_dataset().targets)]
+
+
+@functools.cache
+def get_sampler():
+    sample_weights = get_sample_weights()
+    return WeightedRandomSampler(sample_weights, num_samples=len(sample_weights), replacement=True)
 
-sampler = WeightedRandomSampler(sample_weights, num_samples=len(sample_weights), replacement=True)
 
 # === data loaders ===
-train_loader = DataLoader(train_dataset, batch_size=16, sampler=sampler)
-test_loader = DataLoader(test_dataset, batch_size=16, shuffle=False)
+@functools.cache
+def get_train_loader():
+    return make_loader(get_train_dataset(), batch_size=16, sampler=get_sampler())
+
+
+@functools.cache
+def get_test_loader():
+    return make_loader(get_test_dataset(), batch_size=16, shuffle=False)
+
+
+_LAZY_ATTRIBUTES = {
+    "train_dataset": get_train_dataset,
+    "train_eval_dataset": get_train_eval_dataset,
+    "test_dataset": get_test_dataset,
+    "class_counts": get_class_counts,
+    "class_weights": get_class_weights,
+    "sample_weights": get_sample_weights,
+    "sampler": get_sampler,
+    "train_loader": get_train_loader,
+    "test_loader": get_test_loader,
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # === quick check ===
-print(f"Number of training samples: {len(train_dataset)}")
-print(f"Number of testing samples: {len(test_dataset)}")
-print(f"Classes: {train_dataset.classes}")
\ No newline at end of file
+if __name__ == "__main__":
+    print(f"Number of training samples: {len(get_train_dataset())}")
+    print(f"Number of testing samples: {len(get_test_dataset())}")
+    print(f"Classes: {get_train_dataset().classes}")
+    print(f"Data loading: {loader_settings()}")
+    get_class_weights()
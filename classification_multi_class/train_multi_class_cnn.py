@@ -2,7 +2,7 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 import matplotlib.pyplot as plt
-from multi_class_dataset_preprocessing import train_loader, test_loader, class_weights
+from multi_class_dataset_preprocessing import train_loader, test_loader, class_weights, augment_batch
 from multi_class_cnn_model import MultiClassCNN
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -21,7 +21,9 @@ for epoch in range(num_epochs):
     model.train()
     running_loss = 0.0
     for images, labels in train_loader:
-        images, labels = images.to(device), labels.to(device)
+        images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True)
+        if augment_batch is not None:
+            images = augment_batch(images)
         optimizer.zero_grad()
         outputs = model(images)
         loss = criterion(outputs, labels)
@@ -36,7 +38,7 @@ for epoch in range(num_epochs):
     correct, total = 0, 0
     with torch.no_grad():
         for images, labels in test_loader:
-            images, labels = images.to(device), labels.to(device)
+            images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True)
             outputs = model(images)
             _, preds = torch.max(outputs, 1)
             correct += (preds == labels).sum().item()
@@ -3,7 +3,8 @@ import torch.nn as nn
 import torch.optim as optim
 import matplotlib.pyplot as plt
 from torchvision import models
-from multi_class_dataset_preprocessing import train_loader, test_loader, class_weights
+import multi_class_dataset_preprocessing as data
+from feature_cache import DATA_FEATURE_CACHE, FEATURE_CACHE_VIEWS, ResNetHead, feature_loader
 import time
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -22,8 +23,24 @@ for param in model.layer4.parameters():
 for param in model.fc.parameters():
     param.requires_grad = True
 
+# === frozen-trunk feature cache (DATA_FEATURE_CACHE=1) ===
+# conv1..layer3 run once per image (and view) instead of every epoch; training and
+# validation then run only layer4 + fc on the cached layer3 features; the image
+# loaders are only built without it
+forward = model
+augment_batch = data.augment_batch
+if DATA_FEATURE_CACHE:
+    source = data.train_dataset if FEATURE_CACHE_VIEWS else data.train_eval_dataset
+    train_loader = feature_loader(model, "multi_class_train", source, device, batch_size=16,
+                                  views=FEATURE_CACHE_VIEWS, augment=augment_batch, sampler=data.sampler)
+    test_loader = feature_loader(model, "multi_class_test", data.test_dataset, device, batch_size=16)
+    augment_batch = None
+    forward = ResNetHead(model)
+else:
+    train_loader, test_loader = data.train_loader, data.test_loader
+
 # === loss and optimizer ===
-criterion = nn.CrossEntropyLoss(weight=class_weights.to(device))
+criterion = nn.CrossEntropyLoss(weight=data.class_weights.to(device))
 optimizer = optim.Adam(
     list(model.layer4.parameters()) + list(model.fc.parameters()),
     lr=1e-4
@@ -40,9 +57,11 @@ for epoch in range(num_epochs):
     model.train()
     running_loss = 0.0
     for images, labels in train_loader:
-        images, labels = images.to(device), labels.to(device)
+        images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True)
+        if augment_batch is not None:
+            images = augment_batch(images)
         optimizer.zero_grad()
-        outputs = model(images)
+        outputs = forward(images)
         loss = criterion(outputs, labels)
         loss.backward()
         optimizer.step()
@@ -55,8 +74,8 @@ for epoch in range(num_epochs):
     correct, total = 0, 0
     with torch.no_grad():
         for images, labels in test_loader:
-            images, labels = images.to(device), labels.to(device)
-            outputs = model(images)
+            images, labels = images.to(device, non_blocking=True), labels.to(device, non_blocking=True)
+            outputs = forward(images)
             _, preds = torch.max(outputs, 1)
             correct += (preds == labels).sum().item()
             total += labels.size(0)
@@ -0,0 +1,68 @@
+import os
+import sys
+import multiprocessing
+import torch
+from torch.utils.data import DataLoader
+
+# Shared DataLoader configuration for the classification and segmentation pipelines.
+#   DATA_WORKERS          "auto" (default) or a worker process count; 0 loads in the training process
+#   DATA_PIN_MEMORY       "auto" (default: on when CUDA is available), 1 or 0
+#   DATA_PREFETCH_FACTOR  batches each worker keeps ready ahead of the training loop (default 2)
+DATA_WORKERS = os.getenv("DATA_WORKERS", "auto").lower()
+DATA_PIN_MEMORY = os.getenv("DATA_PIN_MEMORY", "auto").lower()
+DATA_PREFETCH_FACTOR = int(os.getenv("DATA_PREFETCH_FACTOR", "2"))
+MAX_AUTO_WORKERS = 8
+
+
+def _available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _worker_context():
+    # The training scripts run at module level, so workers started with spawn/forkserver
+    # would re-execute them on import; forked workers inherit the parent instead.
+    if sys.platform.startswith("linux"):
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def auto_workers():
+    """One worker per available CPU, keeping one for the training loop (at most MAX_AUTO_WORKERS).
+
+    Falls back to 0 where workers cannot be forked; set DATA_WORKERS explicitly there.
+    """
+    if _worker_context() is None:
+        return 0
+    return max(0, min(MAX_AUTO_WORKERS, _available_cpus() - 1))
+
+
+def num_workers():
+    return auto_workers() if DATA_WORKERS == "auto" else int(DATA_WORKERS)
+
+
+def pin_memory():
+    if DATA_PIN_MEMORY == "auto":
+        return torch.cuda.is_available()
+    return DATA_PIN_MEMORY in ("1", "true", "yes")
+
+
+def make_loader(dataset, batch_size, shuffle=False, sampler=None, workers=None, drop_last=False):
+    """DataLoader with the shared worker, pinning and prefetch settings.
+
+    Workers are persistent, so the pool is started once and reused every epoch.
+    """
+    workers = num_workers() if workers is None else workers
+    kwargs = {}
+    if workers > 0:
+        kwargs.update(persistent_workers=True, prefetch_factor=DATA_PREFETCH_FACTOR,
+                      multiprocessing_context=_worker_context())
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, sampler=sampler, drop_last=drop_last,
+                      num_workers=workers, pin_memory=pin_memory(), **kwargs)
+
+
+def loader_settings():
+    """Effective settings, for the scripts' startup log line."""
+    return {"workers": num_workers(), "pin_memory": pin_memory(), "prefetch_factor": DATA_PREFETCH_FACTOR}
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+from torchvision import datasets, transforms
+from data_loading import make_loader
+
+# Packed datasets: every image decoded and resized once into a single uint8 .npy
+# (N, C, size, size), memory-mapped at training time, with labels/classes in a JSON
+# sidecar. Segmentation packs store the mask as a 4th channel so geometric
+# augmentations can be applied to image and mask together.
+#   DATA_PACKED  1 to train from packs (built on first use if missing), 0 (default) for the image folders
+DATA_PACKED = os.getenv("DATA_PACKED", "0").lower() in ("1", "true", "yes")
+
+
+def pack_path(source, size):
+    """Default pack location next to the source folder, e.g. Dataset_multi_class/Training_224px.npy."""
+    return f"{os.path.normpath(source)}_{size}px.npy"
+
+
+class _DecodeDataset(Dataset):
+    """(image path, mask path or None) -> uint8 CHW array, resized like transforms.Resize on PIL."""
+
+    def __init__(self, samples, size):
+        self.samples = samples
+        self.resize = transforms.Resize((size, size))
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, index):
+        image_path, mask_path = self.samples[index]
+        planes = np.asarray(self.resize(Image.open(image_path).convert("RGB"))).transpose(2, 0, 1)
+        if mask_path is not None:
+            mask = np.asarray(self.resize(Image.open(mask_path).convert("L")))
+            planes = np.concatenate([planes, mask[None]])
+        return torch.from_numpy(np.ascontiguousarray(planes))
+
+
+def pack_samples(samples, path, size, labels=None, classes=None, batch_size=64):
+    """Decode and resize `samples` [(image_path, mask_path or None), ...] into the pack at `path`.
+
+    Decoding runs in the shared DataLoader workers. The arrays are written to a temporary
+    file that replaces `path` only when complete, so an interrupted run leaves no pack.
+    """
+    channels = 4 if samples and samples[0][1] is not None else 3
+    tmp_path = path + ".tmp.npy"
+    images = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(len(samples), channels, size, size))
+    start, offset = time.perf_counter(), 0
+    for batch in make_loader(_DecodeDataset(samples, size), batch_size=batch_size):
+        images[offset:offset + len(batch)] = batch.numpy()
+        offset += len(batch)
+    images.flush()
+    del images
+    meta = {"size": size, "channels": channels, "classes": classes,
+            "labels": None if labels is None else [int(label) for label in labels],
+            "sources": [image_path for image_path, _ in samples]}
+    with open(os.path.splitext(path)[0] + ".json", "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+    print(f"Packed {len(samples)} images into {path} ({os.path.getsize(path) / 1e6:.0f} MB) "
+          f"in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def pack_image_folder(root, size, path=None):
+    folder = datasets.ImageFolder(root=root)
+    return pack_samples([(p, None) for p, _ in folder.samples], path or pack_path(root, size), size,
+                        labels=folder.targets, classes=folder.classes)
+
+
+class PackedDataset(Dataset):
+    """Dataset over a pack. Items are zero-copy uint8 CHW tensor views into the memmap.
+
+    Classification packs yield (transform(image), label); segmentation packs yield
+    transform(image_and_mask), so the transform splits the 4 channels itself.
+    """
+
+    def __init__(self, path, transform=None):
+        # copy-on-write: views stay writable for torch without touching the file
+        self.images = np.load(path, mmap_mode="c")
+        with open(os.path.splitext(path)[0] + ".json") as f:
+            meta = json.load(f)
+        self.classes = meta["classes"]
+        self.targets = meta["labels"]
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, index):
+        sample = torch.from_numpy(self.images[index])
+        if self.transform is not None:
+            sample = self.transform(sample)
+        if self.targets is None:
+            return sample
+        return sample, self.targets[index]
+
+
+def open_image_folder_pack(root, size, transform=None):
+    """PackedDataset for an ImageFolder tree, packing it first if needed (delete the .npy to repack)."""
+    path = pack_path(root, size)
+    if not os.path.exists(path):
+        pack_image_folder(root, size, path)
+    return PackedDataset(path, transform)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack an ImageFolder tree into a memory-mapped uint8 dataset")
+    parser.add_argument("root", help="ImageFolder root, e.g. Dataset_multi_class/Training")
+    parser.add_argument("--size", type=int, default=224)
+    parser.add_argument("--output", default=None, help="pack path (default: <root>_<size>px.npy)")
+    args = parser.parse_args()
+    pack_image_folder(args.root, args.size, args.output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
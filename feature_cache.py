@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import Dataset
+from data_loading import make_loader
+
+# Frozen-trunk feature cache for the layer4 + fc fine-tuning scripts: the ResNet18
+# conv1..layer3 outputs are computed once per dataset and stored as an fp16 memmap
+# (views, N, 256, 14, 14), so every epoch only runs layer4, the pooling and fc.
+#   DATA_FEATURE_CACHE   1 to train from cached layer3 features, 0 (default) for the full forward
+#   FEATURE_CACHE_VIEWS  0 (default): one unaugmented view per image; K: K augmented views,
+#                        one picked at random per image and epoch
+#   FEATURE_CACHE_DIR    where the caches are written (default: feature_cache)
+DATA_FEATURE_CACHE = os.getenv("DATA_FEATURE_CACHE", "0").lower() in ("1", "true", "yes")
+FEATURE_CACHE_VIEWS = int(os.getenv("FEATURE_CACHE_VIEWS", "0"))
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "feature_cache")
+
+
+def resnet_trunk(model):
+    """The frozen part of a torchvision ResNet: conv1 .. layer3, sharing the model's modules."""
+    return nn.Sequential(model.conv1, model.bn1, model.relu, model.maxpool, model.layer1, model.layer2, model.layer3)
+
+
+class ResNetHead(nn.Module):
+    """layer4 -> avgpool -> fc of a torchvision ResNet, applied to cached layer3 features.
+
+    The modules are the model's own, so training the head trains `model`.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.layer4 = model.layer4
+        self.avgpool = model.avgpool
+        self.fc = model.fc
+
+    def forward(self, x):
+        return self.fc(torch.flatten(self.avgpool(self.layer4(x)), 1))
+
+
+class FeatureDataset(Dataset):
+    """(layer3 features as float32, label) from a cache; one random view per item when there are several."""
+
+    def __init__(self, path):
+        self.features = np.load(path, mmap_mode="c")
+        with open(os.path.splitext(path)[0] + ".json") as f:
+            meta = json.load(f)
+        self.targets = meta["labels"]
+        self.classes = meta["classes"]
+
+    def __len__(self):
+        return self.features.shape[1]
+
+    def __getitem__(self, index):
+        view = int(torch.randint(len(self.features), ())) if len(self.features) > 1 else 0
+        return torch.from_numpy(self.features[view, index]).float(), self.targets[index]
+
+
+def build_feature_cache(trunk, dataset, path, device, views=0, augment=None, batch_size=64):
+    """Write the trunk's fp16 outputs for every image of `dataset` (in order) to `path`.
+
+    With views=0 the dataset should yield unaugmented images. With views=K the dataset
+    (or `augment`, applied to each device batch) is sampled K times.
+    """
+    passes = max(views, 1)
+    trunk.eval()
+    loader = make_loader(dataset, batch_size=batch_size, shuffle=False)
+    tmp_path = path + ".tmp.npy"
+    features, labels = None, []
+    start = time.perf_counter()
+    with torch.no_grad():
+        for view in range(passes):
+            offset = 0
+            for images, targets in loader:
+                images = images.to(device, non_blocking=True)
+                if views and augment is not None:
+                    images = augment(images)
+                out = trunk(images).half().cpu().numpy()
+                if features is None:
+                    features = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16,
+                                                         shape=(passes, len(dataset), *out.shape[1:]))
+                features[view, offset:offset + len(out)] = out
+                offset += len(out)
+                if view == 0:
+                    labels.extend(int(t) for t in targets)
+    features.flush()
+    del features
+    with open(os.path.splitext(path)[0] + ".json", "w") as f:
+        json.dump({"images": len(dataset), "views": views, "labels": labels,
+                   "classes": getattr(dataset, "classes", None)}, f)
+    os.replace(tmp_path, path)
+    print(f"Cached layer3 features of {len(dataset)} images x {passes} view(s) in {path} "
+          f"({os.path.getsize(path) / 1e6:.0f} MB, {time.perf_counter() - start:.1f}s)")
+    return path
+
+
+def feature_loader(model, name, dataset, device, batch_size, views=0, augment=None, sampler=None, shuffle=False):
+    """Loader over cached layer3 features of `dataset`, building the cache first if needed.
+
+    The cache is rebuilt when the image count or the number of views changes; delete it
+    after changing the images or the trunk weights.
+    """
+    trunk = resnet_trunk(model)
+    if any(p.requires_grad for p in trunk.parameters()):
+        raise ValueError("the feature cache needs conv1..layer3 frozen (requires_grad=False)")
+    os.makedirs(FEATURE_CACHE_DIR, exist_ok=True)
+    path = os.path.join(FEATURE_CACHE_DIR, f"{name}_{views}views.npy")
+    meta_path = os.path.splitext(path)[0] + ".json"
+    meta = None
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    if meta is None or meta["images"] != len(dataset) or meta["views"] != views:
+        build_feature_cache(trunk, dataset, path, device, views, augment)
+    return make_loader(FeatureDataset(path), batch_size=batch_size, sampler=sampler, shuffle=shuffle)
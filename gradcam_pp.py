@@ -1,5 +1,8 @@
 import argparse
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import torch
 import numpy as np
 import torch.nn.functional as F
@@ -72,18 +75,61 @@ _JET_CMAP = np.array([
 ], dtype=np.uint8)
 
 
+def _add_time(timings, name, start):
+    """Add the seconds since `start` to timings[name] (if timings is not None); returns now."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + now - start
+    return now
+
+
 # ================================================================
 #                     GRAD-CAM++ CLASS
 # ================================================================
 class GradCAMPP:
-    def __init__(self, model, target_layer):
+    """Grad-CAM++ engine.
+
+    Hooks are registered once by `attach()` and removed by `detach()`, so a single
+    instance can be kept for the lifetime of a server. Calls are serialized with a
+    lock because the hooks write into per-instance buffers.
+    """
+
+    def __init__(self, model, target_layer, attach=True):
         self.model = model
         self.target_layer = target_layer
         self.gradients = []
         self.activations = []
+        self._handles = []
+        self._lock = threading.Lock()
+
+        if attach:
+            self.attach()
+
+    @property
+    def attached(self):
+        return bool(self._handles)
+
+    def attach(self):
+        if self._handles:
+            return self
+        self._handles = [
+            self.target_layer.register_forward_hook(self.save_activation),
+            self.target_layer.register_full_backward_hook(self.save_gradient),
+        ]
+        return self
+
+    def detach(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        self.gradients = []
+        self.activations = []
 
-        target_layer.register_forward_hook(self.save_activation)
-        target_layer.register_full_backward_hook(self.save_gradient)
+    def __enter__(self):
+        return self.attach()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.detach()
 
     def save_activation(self, module, input, output):
         self.activations.append(output)
@@ -92,81 +138,327 @@ class GradCAMPP:
         self.gradients.append(grad_output[0])
 
     def generate(self, input_tensor, class_idx=None):
+        _, cam, class_idx = self.forward_backward(input_tensor, class_idx)
+        return cam, class_idx
+
+    def forward_backward(self, input_tensor, class_idx=None):
+        """Single forward+backward pass returning (logits, cam, class_idx)."""
+        class_indices = None if class_idx is None else [class_idx]
+        logits, cams, class_indices = self.forward_backward_batch(input_tensor, class_indices)
+        return logits, cams[0], class_indices[0]
+
+    def forward_backward_batch(self, input_batch, class_indices=None, timings=None):
+        """One batched forward+backward over N images.
+
+        Returns (logits (N, num_classes), cams (N, H, W) numpy array, list of N class indices).
+        If given, `timings` accumulates seconds spent in "forward", "backward" and "cam".
+        """
+        if not self._handles:
+            raise RuntimeError("GradCAMPP hooks are detached; call attach() first")
+
+        with self._lock:
+            try:
+                return self._forward_backward(input_batch, class_indices, self.model, timings)
+            finally:
+                # drop references to the autograd graph between requests
+                self.gradients = []
+                self.activations = []
+
+    def capture_block_input(self, input_batch, block, timings=None):
+        """No-grad forward returning (logits, input of `block`).
+
+        `block` must contain the target layer; explain_from() later recomputes
+        only that part of the network with gradients, so classification does
+        not have to pay for autograd.
+        """
+        captured = []
+        # the hook lives only while the lock is held, so a concurrent forward on
+        # the shared model cannot hand it another batch's activations
+        with self._lock:
+            handle = block.register_forward_pre_hook(lambda module, args: captured.append(args[0]))
+            try:
+                self.model.eval()
+                start = time.perf_counter()
+                with torch.no_grad():
+                    logits = self.model(input_batch)
+                _add_time(timings, "forward", start)
+            finally:
+                handle.remove()
+                self.activations = []
+        if len(captured) != 1 or captured[0].shape[0] != input_batch.shape[0]:
+            raise RuntimeError(f"captured {len(captured)} block inputs for a batch of {input_batch.shape[0]}")
+        return logits, captured[0]
+
+    def explain_from(self, block_input, tail, class_indices, timings=None):
+        """Grad-CAM++ maps from a captured block input.
+
+        `tail(block_input)` must run the rest of the network (through the target
+        layer) to logits. Gives the same maps as forward_backward_batch() for the
+        same classes. Returns (logits, cams, class indices).
+        """
+        if not self._handles:
+            raise RuntimeError("GradCAMPP hooks are detached; call attach() first")
+
+        with self._lock:
+            try:
+                return self._forward_backward(block_input.detach().requires_grad_(), class_indices, tail, timings)
+            finally:
+                self.gradients = []
+                self.activations = []
+
+    def _forward_backward(self, input_batch, class_indices, forward, timings=None):
         self.model.eval()
         self.gradients = []
         self.activations = []
 
-        output = self.model(input_tensor)
+        start = time.perf_counter()
+        output = forward(input_batch)
+        start = _add_time(timings, "forward", start)
 
-        if class_idx is None:
-            class_idx = output.argmax(dim=1).item()
+        if class_indices is None:
+            class_indices = output.argmax(dim=1).tolist()
 
-        self.model.zero_grad()
-        output[0, class_idx].backward()
+        # samples are independent in eval mode, so the gradient of the summed
+        # target scores gives every image its own per-sample gradient
+        index = torch.as_tensor(class_indices, device=output.device).unsqueeze(1)
+        self.model.zero_grad(set_to_none=True)
+        output.gather(1, index).sum().backward()
+        start = _add_time(timings, "backward", start)
 
-        grad = self.gradients[0].squeeze(0)
-        act = self.activations[0].squeeze(0)
+        cams = self.compute_cams(self.gradients[0], self.activations[0]).cpu().numpy()
+        _add_time(timings, "cam", start)
 
-        numerator = grad.pow(2)
-        denominator = 2 * grad.pow(2) + (act * grad.pow(3)).sum((1, 2), keepdim=True)
-        alpha = numerator / (denominator + 1e-7)
+        return output.detach(), cams, list(class_indices)
 
-        weights = (alpha * F.relu(grad)).sum(dim=(1, 2))
-        cam = torch.zeros(act.shape[1:], dtype=torch.float32)
+    @staticmethod
+    def compute_cams(grads, acts):
+        """Grad-CAM++ maps for a batch: (N,C,H,W) gradients/activations -> (N,H,W).
 
-        for i, w in enumerate(weights):
-            cam += w * act[i]
+        Channel weighting, ReLU and min-max normalization are batched tensor ops
+        that stay on the activations' device.
+        """
+        # float32 math even when the model ran under bf16/fp16 autocast
+        grads = grads.detach().float()
+        acts = acts.detach().float()
 
-        cam = F.relu(cam)
-        cam = cam - cam.min()
-        cam = cam / (cam.max() + 1e-7)
+        grads_2 = grads.pow(2)
+        denominator = 2 * grads_2 + (acts * grads.pow(3)).sum((2, 3), keepdim=True)
+        alpha = grads_2 / (denominator + 1e-7)
 
-        cam = cam.detach().cpu().numpy()
+        weights = (alpha * F.relu(grads)).sum(dim=(2, 3))          # (N, C)
+        cams = torch.einsum("nc,nchw->nhw", weights, acts)        # (N, H, W)
 
-        return cam, class_idx
+        cams = F.relu(cams)
+        cams = cams - cams.amin(dim=(1, 2), keepdim=True)
+        cams = cams / (cams.amax(dim=(1, 2), keepdim=True) + 1e-7)
+
+        return cams.float()
 
 
 # ================================================================
 #                     IMAGE PROCESSING HELPERS (PIL/numpy, no cv2)
 # ================================================================
-def _resize_cam(cam, out_h, out_w):
-    """Resize 2D cam to (out_h, out_w) using PIL."""
-    cam_uint8 = (np.clip(cam, 0, 1) * 255).astype(np.uint8)
-    pil = Image.fromarray(cam_uint8).resize((out_w, out_h), Image.BILINEAR)
-    return np.array(pil, dtype=np.float32) / 255.0
+RENDER_OUTPUTS = ("heatmap", "bounding_box", "contour", "mask")
+
+# heatmap = 0.6 * image + 0.4 * JET = (3 * image + 2 * JET) // 5, exactly, in uint16
+_JET_CMAP_X2 = _JET_CMAP.astype(np.uint16) * 2
+_GREEN = np.array([0, 255, 0], dtype=np.uint8)
 
 
-def _apply_jet_colormap(gray_uint8):
-    """Apply JET colormap: (H,W) uint8 -> (H,W,3) RGB uint8."""
-    return _JET_CMAP[np.clip(gray_uint8, 0, 255)]
+def _resize_cam(cam, out_h, out_w):
+    """Resize 2D cam in [0, 1] to (out_h, out_w) uint8 levels (0-255) using PIL."""
+    cam_uint8 = (np.clip(cam, 0, 1) * 255).astype(np.uint8)
+    return np.asarray(Image.fromarray(cam_uint8).resize((out_w, out_h), Image.BILINEAR))
+
+
+def cam_regions(cam, image_shape, threshold=0.5, grid=56, min_area=0.002, max_regions=8):
+    """Separate hot spots of a CAM as boxes in image coordinates.
+
+    Connected components (8-connected) of CAM > `threshold` are found on a
+    grid x grid bilinear upsampling of the low-resolution CAM, not on the full
+    image, and their boxes are scaled to `image_shape` (H, W). Regions smaller
+    than `min_area` (fraction of the image) are dropped.
+    Returns up to `max_regions` dicts, hottest first:
+    {"box": [x_min, y_min, x_max, y_max] (inclusive pixels), "area": fraction
+    of the image, "peak": highest value of the CAM cells under the region}.
+    """
+    cam = np.asarray(cam)
+    level = _resize_cam(cam, grid, grid)
+    ys, xs = np.nonzero(level > int(threshold * 255))
+    todo = set(zip(ys.tolist(), xs.tolist()))
+    scale_y, scale_x = image_shape[0] / grid, image_shape[1] / grid
+
+    regions = []
+    while todo:
+        stack = [todo.pop()]
+        cells = []
+        while stack:
+            y, x = stack.pop()
+            cells.append((y, x))
+            for neighbour in ((y - 1, x - 1), (y - 1, x), (y - 1, x + 1), (y, x - 1),
+                              (y, x + 1), (y + 1, x - 1), (y + 1, x), (y + 1, x + 1)):
+                if neighbour in todo:
+                    todo.remove(neighbour)
+                    stack.append(neighbour)
+        if len(cells) < min_area * grid * grid:
+            continue
+        rows, cols = (np.array(c) for c in zip(*cells))
+        regions.append({
+            "box": [int(cols.min() * scale_x), int(rows.min() * scale_y),
+                    min(image_shape[1], int(np.ceil((cols.max() + 1) * scale_x))) - 1,
+                    min(image_shape[0], int(np.ceil((rows.max() + 1) * scale_y))) - 1],
+            "area": round(len(cells) / (grid * grid), 4),
+            "peak": round(float(cam[rows * cam.shape[0] // grid, cols * cam.shape[1] // grid].max()), 3),
+        })
+    regions.sort(key=lambda r: r["peak"], reverse=True)
+    return regions[:max_regions]
+
+
+def render_cams(images, cams, threshold=0.5, outputs=("heatmap", "bounding_box"), regions=None):
+    """Render CAMs over their images: one resize per CAM, integer math only.
+
+    images: (H,W,3) RGB uint8 arrays; cams: matching 2D maps in [0, 1] (any size).
+    outputs: any of RENDER_OUTPUTS. "heatmap" is the JET overlay, "bounding_box"
+    draws one box per cam_regions() region (pass `regions`, one list per image,
+    to reuse ones already computed), "contour" outlines the pixels where the CAM
+    exceeds `threshold` and "mask" is that area as (H,W) uint8 (255 inside).
+    Returns one {output: array} dict per image.
+
+    Images are rendered one at a time: stacking same-sized images into one
+    (N,H,W,3) array measured slower, the extra copy and the larger working set
+    costing more than the per-call overhead saved.
+    """
+    unknown = set(outputs) - set(RENDER_OUTPUTS)
+    if unknown:
+        raise ValueError(f"Unknown render outputs {sorted(unknown)}; expected some of {list(RENDER_OUTPUTS)}")
+    if regions is None and "bounding_box" in outputs:
+        regions = [cam_regions(cam, img.shape[:2], threshold) for img, cam in zip(images, cams)]
+    return [_render(img, cam, threshold, outputs, regions and regions[i])
+            for i, (img, cam) in enumerate(zip(images, cams))]
+
+
+def render_cam(img, cam, threshold=0.5, outputs=("heatmap", "bounding_box"), regions=None):
+    """render_cams() for a single image."""
+    return render_cams([img], [cam], threshold, outputs, None if regions is None else [regions])[0]
+
+
+def _render(img, cam, threshold, outputs, regions):
+    rendered = {}
+    if "bounding_box" in outputs:
+        boxed = img.copy()
+        for region in regions:
+            _draw_box(boxed, *region["box"])
+        rendered["bounding_box"] = boxed
+    if not {"heatmap", "contour", "mask"} & set(outputs):
+        return rendered
+
+    level = _resize_cam(cam, img.shape[0], img.shape[1])
+    if "heatmap" in outputs:
+        blended = img.astype(np.uint16)
+        blended *= 3
+        blended += np.take(_JET_CMAP_X2, level, axis=0)
+        blended //= 5
+        rendered["heatmap"] = blended.astype(np.uint8)
+    if "contour" in outputs or "mask" in outputs:
+        # level / 255 > threshold  <=>  level > floor(255 * threshold)
+        mask = level > int(threshold * 255)
+        if "contour" in outputs:
+            outline = mask & ~_erode(_erode(mask))  # 2 px inside the area's edge
+            contoured = img.copy()
+            contoured[outline] = _GREEN
+            rendered["contour"] = contoured
+        if "mask" in outputs:
+            rendered["mask"] = mask.view(np.uint8) * np.uint8(255)
+    return rendered
+
+
+def _draw_box(img, x_min, y_min, x_max, y_max, thick=2):
+    """Draw an inclusive box on img, in place."""
+    img[y_min : y_min + thick, x_min : x_max + 1] = _GREEN
+    img[y_max - thick + 1 : y_max + 1, x_min : x_max + 1] = _GREEN
+    img[y_min : y_max + 1, x_min : x_min + thick] = _GREEN
+    img[y_min : y_max + 1, x_max - thick + 1 : x_max + 1] = _GREEN
+
+
+def _erode(mask):
+    """4-neighbour binary erosion of an (H,W) mask; outside the image counts as background."""
+    eroded = mask.copy()
+    eroded[1:, :] &= mask[:-1, :]
+    eroded[:-1, :] &= mask[1:, :]
+    eroded[:, 1:] &= mask[:, :-1]
+    eroded[:, :-1] &= mask[:, 1:]
+    eroded[[0, -1], :] = False
+    eroded[:, [0, -1]] = False
+    return eroded
 
 
 def overlay_heatmap(img, cam):
     # img: (H,W,3) RGB numpy uint8
-    out_h, out_w = img.shape[0], img.shape[1]
-    cam = _resize_cam(cam, out_h, out_w)
-    heatmap = _apply_jet_colormap((cam * 255).astype(np.uint8))
-    blended = np.clip(img.astype(np.float32) * 0.6 + heatmap.astype(np.float32) * 0.4, 0, 255).astype(np.uint8)
-    return blended
+    return render_cam(img, cam, outputs=("heatmap",))["heatmap"]
 
 
 def draw_bounding_box(img, cam, threshold=0.5):
-    out_h, out_w = img.shape[0], img.shape[1]
-    cam = _resize_cam(cam, out_h, out_w)
-    mask = cam > threshold
-    rows, cols = np.where(mask)
-    if rows.size == 0:
-        return img.copy()
-    y_min, y_max = int(rows.min()), int(rows.max())
-    x_min, x_max = int(cols.min()), int(cols.max())
-    boxed = img.copy()
-    green = np.array([0, 255, 0], dtype=boxed.dtype)
-    thick = 2
-    boxed[y_min : y_min + thick, x_min : x_max + 1] = green
-    boxed[y_max - thick + 1 : y_max + 1, x_min : x_max + 1] = green
-    boxed[y_min : y_max + 1, x_min : x_min + thick] = green
-    boxed[y_min : y_max + 1, x_max - thick + 1 : x_max + 1] = green
-    return boxed
+    return render_cam(img, cam, threshold, outputs=("bounding_box",))["bounding_box"]
+
+
+# ================================================================
+#                     BATCH PIPELINE (CLI)
+# ================================================================
+_TRANSFORM = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+])
+
+
+class _ImageFileDataset(torch.utils.data.Dataset):
+    """Decodes images in DataLoader workers: (model input, original uint8 array, index)."""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        try:
+            img_pil = Image.open(self.paths[index]).convert("RGB")
+        except Exception as e:
+            print(f"Skipping {self.paths[index]}: {e}")
+            return None
+        return _TRANSFORM(img_pil), np.array(img_pil), index
+
+
+def _collate(samples):
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        return None
+    tensors, images, indices = zip(*samples)
+    return torch.stack(tensors), list(images), list(indices)
+
+
+def _output_paths(input_path, input_dir, output_dir):
+    # preserve subfolder structure
+    relative = os.path.relpath(os.path.dirname(input_path), input_dir)
+    output_subfolder = os.path.join(output_dir, relative)
+    basename = os.path.splitext(os.path.basename(input_path))[0]
+    return (os.path.join(output_subfolder, f"{basename}_heatmap.png"),
+            os.path.join(output_subfolder, f"{basename}_bbox.png"))
+
+
+def _save_png(array, path):
+    # written next to the target and renamed, so an interrupted run never leaves a
+    # truncated PNG that --resume would take for a finished one
+    tmp_path = path + ".tmp"
+    Image.fromarray(array).save(tmp_path, format="PNG")
+    os.replace(tmp_path, path)
+
+
+def _render_and_save(img, cam, heatmap_path, bbox_path):
+    os.makedirs(os.path.dirname(heatmap_path), exist_ok=True)
+    rendered = render_cam(img, cam)
+    _save_png(rendered["heatmap"], heatmap_path)
+    _save_png(rendered["bounding_box"], bbox_path)
 
 
 # ================================================================
@@ -176,6 +468,10 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--input_dir", type=str, required=True, help="Path to dataset folder")
     parser.add_argument("--output_dir", type=str, required=True, help="Folder to save heatmaps/bboxes")
+    parser.add_argument("--batch_size", type=int, default=16, help="Images per batched forward/backward")
+    parser.add_argument("--num_workers", type=int, default=2, help="DataLoader workers decoding ahead of the model")
+    parser.add_argument("--writers", type=int, default=4, help="Threads rendering overlays and saving PNGs")
+    parser.add_argument("--resume", action="store_true", help="Skip images whose outputs already exist")
     args = parser.parse_args()
 
     # ------------------- Load model -------------------
@@ -191,46 +487,70 @@ def main():
     target_layer = model.layer4[-1].conv2
     grad_cam_pp = GradCAMPP(model, target_layer)
 
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
-
-    # ------------------- Process directory -------------------
+    # ------------------- Collect work -------------------
+    jobs = []
+    skipped = 0
     for root, dirs, files in os.walk(args.input_dir):
-        for file in files:
+        dirs.sort()
+        for file in sorted(files):
             if not file.lower().endswith((".png", ".jpg", ".jpeg")):
                 continue
-
             input_path = os.path.join(root, file)
+            outputs = _output_paths(input_path, args.input_dir, args.output_dir)
+            if args.resume and all(os.path.exists(p) for p in outputs):
+                skipped += 1
+                continue
+            jobs.append((input_path, outputs))
 
-            # preserve subfolder structure
-            relative = os.path.relpath(root, args.input_dir)
-            output_subfolder = os.path.join(args.output_dir, relative)
-            os.makedirs(output_subfolder, exist_ok=True)
-
-            print(f"Processing {input_path} ...")
-
-            img_pil = Image.open(input_path).convert("RGB")
-            img = np.array(img_pil)
+    print(f"{len(jobs)} images to process ({skipped} already done)")
+    if not jobs:
+        grad_cam_pp.detach()
+        return
 
-            input_tensor = transform(img_pil).unsqueeze(0).to(device)
+    # ------------------- Process directory -------------------
+    # decode (DataLoader workers) -> batched CAMs (main thread) -> render + save (writer threads)
+    loader = torch.utils.data.DataLoader(
+        _ImageFileDataset([path for path, _ in jobs]),
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        collate_fn=_collate,
+        pin_memory=device.type == "cuda",
+        prefetch_factor=4 if args.num_workers > 0 else None,
+    )
+
+    start = time.perf_counter()
+    done = 0
+    pending = set()
+    with ThreadPoolExecutor(max_workers=args.writers) as writers:
+        for batch in loader:
+            if batch is None:
+                continue
+            input_batch, images, indices = batch
+            _, cams, _ = grad_cam_pp.forward_backward_batch(input_batch.to(device, non_blocking=True))
 
-            # generate CAM
-            cam, class_idx = grad_cam_pp.generate(input_tensor)
+            for img, cam, index in zip(images, cams, indices):
+                heatmap_path, bbox_path = jobs[index][1]
+                pending.add(writers.submit(_render_and_save, img, cam, heatmap_path, bbox_path))
 
-            heatmap = overlay_heatmap(img, cam)
-            bbox = draw_bounding_box(img, cam)
+            # bound the number of decoded images waiting for a writer
+            while len(pending) > 4 * args.batch_size:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+                    done += 1
 
-            basename = os.path.splitext(file)[0]
-            heatmap_path = os.path.join(output_subfolder, f"{basename}_heatmap.png")
-            bbox_path = os.path.join(output_subfolder, f"{basename}_bbox.png")
+            elapsed = time.perf_counter() - start
+            print(f"Processed {done + len(pending)}/{len(jobs)} images "
+                  f"({(done + len(pending)) / elapsed:.1f} images/sec)")
 
-            Image.fromarray(heatmap).save(heatmap_path)
-            Image.fromarray(bbox).save(bbox_path)
+        for future in pending:
+            future.result()
+            done += 1
 
-    print("\nDONE! All outputs saved to:", args.output_dir)
+    grad_cam_pp.detach()
+    elapsed = time.perf_counter() - start
+    print(f"\nDONE! {done} images in {elapsed:.1f} s ({done / elapsed:.1f} images/sec)")
+    print("All outputs saved to:", args.output_dir)
 
 def run_gradcam(model, device, image_path, target_layer):
     # load image (PIL/numpy, no cv2)
@@ -245,13 +565,12 @@ def run_gradcam(model, device, image_path, target_layer):
 
     input_tensor = transform(img_pil).unsqueeze(0).to(device)
 
-    grad_cam_pp = GradCAMPP(model, target_layer)
-    cam, class_idx = grad_cam_pp.generate(input_tensor)
+    with GradCAMPP(model, target_layer) as grad_cam_pp:
+        cam, class_idx = grad_cam_pp.generate(input_tensor)
 
-    heatmap = overlay_heatmap(img, cam)
-    bbox = draw_bounding_box(img, cam)
+    rendered = render_cam(img, cam)
 
-    return heatmap, bbox
+    return rendered["heatmap"], rendered["bounding_box"]
 
 
 if __name__ == "__main__":
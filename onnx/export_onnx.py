@@ -28,7 +28,7 @@ print("Model loaded and set to eval.")
 # 2) Export to ONNX
 # --------------------------------
 
-onnx_path = "tumor_resnet.onnx"
+onnx_path = "onnx/tumor_resnet.onnx"
 
 # Fixed dummy input matching training
 dummy_input = torch.randn(1, 3, 224, 224)
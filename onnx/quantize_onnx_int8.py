@@ -11,8 +11,8 @@ from onnxruntime.quantization import (
 # =========================
 # CONFIG
 # =========================
-FP32_MODEL = "tumor_resnet.onnx"
-INT8_MODEL = "tumor_resnet_int8.onnx"
+FP32_MODEL = "onnx/tumor_resnet.onnx"
+INT8_MODEL = "onnx/tumor_resnet_int8.onnx"
 
 CALIB_DIR = "Dataset_multi_class/Training"  # uses real training images
 IMG_SIZE = 224
@@ -86,7 +86,7 @@ if __name__ == "__main__":
 import onnxruntime as ort
 
 sess = ort.InferenceSession(
-    "tumor_resnet_int8.onnx",
+    "onnx/tumor_resnet_int8.onnx",
     providers=["CPUExecutionProvider"]
 )
 
@@ -17,8 +17,8 @@ model.eval()
 dice_scores = []
 with torch.no_grad():
     for images, masks in val_loader:
-        images = images.to(device)
-        masks = masks.to(device)
+        images = images.to(device, non_blocking=True)
+        masks = masks.to(device, non_blocking=True)
         
         outputs = model(images)
         dice = dice_coefficient(outputs, masks)
@@ -1,10 +1,16 @@
 import os
+import sys
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset
 from torchvision import transforms
 from PIL import Image
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # repo root
+from data_loading import make_loader
+from dataset_pack import DATA_PACKED, PackedDataset, pack_path, pack_samples
+from batch_augment import DATA_BATCH_AUGMENT, BatchAugment
+
 class SegmentationDataset(Dataset):
     def __init__(self, image_dir, mask_dir, transform=None):
         self.image_dir = image_dir
@@ -15,9 +21,13 @@ class SegmentationDataset(Dataset):
     def __len__(self):
         return len(self.images)
     
-    def __getitem__(self, index):
+    def sample_paths(self, index):
         img_path = os.path.join(self.image_dir, self.images[index])
         mask_path = os.path.join(self.mask_dir, self.images[index].replace('.jpg', '_mask.jpg'))
+        return img_path, mask_path
+    
+    def __getitem__(self, index):
+        img_path, mask_path = self.sample_paths(index)
         
         image = Image.open(img_path).convert("RGB")
         mask = Image.open(mask_path).convert("L")  # Grayscale for binary mask
@@ -26,8 +36,9 @@ class SegmentationDataset(Dataset):
             image = self.transform(image)
             mask = self.transform(mask)
             
-        # Convert mask to binary (0, 1)
-        mask = (mask > 0.5).float()
+        # Convert mask to binary (0, 1); uint8 masks (batch augmentation) are binarized after augmenting
+        if mask.is_floating_point():
+            mask = (mask > 0.5).float()
         
         return image, mask
 
@@ -45,18 +56,64 @@ val_transform = transforms.Compose([
     transforms.ToTensor(),
 ])
 
+# DATA_PACKED=1: samples come from the pack already resized, as uint8 RGB + mask
+# channels, so only the random augmentations run per epoch. Flips and rotations
+# are applied to image and mask together; only the image is jittered.
+packed_geometry = transforms.Compose([
+    transforms.RandomHorizontalFlip(),
+    transforms.RandomRotation(10),
+])
+packed_jitter = transforms.ColorJitter(brightness=0.2, contrast=0.2)
+
+def _split_packed(image, mask):
+    # same scaling as ToTensor, same binarization as mask > 0.5
+    return image.float() / 255, (mask > 127).float()
+
+def packed_train_transform(sample):
+    sample = packed_geometry(sample)
+    return _split_packed(packed_jitter(sample[:3]), sample[3:])
+
+def packed_val_transform(sample):
+    return _split_packed(sample[:3], sample[3:])
+
+# DATA_BATCH_AUGMENT=1: the train loader yields resized uint8 images and masks and
+# the training script applies augment_batch to them on the device
+batch_train_transform = transforms.Compose([
+    transforms.Resize((256, 256)),
+    transforms.PILToTensor(),
+])
+
+def packed_batch_transform(sample):
+    return sample[:3], sample[3:]
+
+augment_batch = BatchAugment(flip_p=0.5, degrees=10, brightness=0.2, contrast=0.2) if DATA_BATCH_AUGMENT else None
+
+def open_segmentation_pack(image_dir, mask_dir, size, transform):
+    """PackedDataset over image_dir + mask_dir, packing them first if needed (delete the .npy to repack)."""
+    path = pack_path(image_dir, size)
+    if not os.path.exists(path):
+        folder = SegmentationDataset(image_dir, mask_dir)
+        pack_samples([folder.sample_paths(i) for i in range(len(folder))], path, size)
+    return PackedDataset(path, transform)
+
 # Create datasets and dataloaders
-train_dataset = SegmentationDataset(
-    image_dir='../Dataset_segmentation/Train/Images',
-    mask_dir='../Dataset_segmentation/Train/Masks',
-    transform=train_transform
-)
-
-val_dataset = SegmentationDataset(
-    image_dir='../Dataset_segmentation/Val/Images',
-    mask_dir='../Dataset_segmentation/Val/Masks',
-    transform=val_transform
-)
-
-train_loader = DataLoader(train_dataset, batch_size=8, shuffle=True)
-val_loader = DataLoader(val_dataset, batch_size=8, shuffle=False)
\ No newline at end of file
+if DATA_PACKED:
+    train_dataset = open_segmentation_pack('../Dataset_segmentation/Train/Images', '../Dataset_segmentation/Train/Masks',
+                                           256, packed_batch_transform if DATA_BATCH_AUGMENT else packed_train_transform)
+    val_dataset = open_segmentation_pack('../Dataset_segmentation/Val/Images', '../Dataset_segmentation/Val/Masks',
+                                         256, packed_val_transform)
+else:
+    train_dataset = SegmentationDataset(
+        image_dir='../Dataset_segmentation/Train/Images',
+        mask_dir='../Dataset_segmentation/Train/Masks',
+        transform=batch_train_transform if DATA_BATCH_AUGMENT else train_transform
+    )
+
+    val_dataset = SegmentationDataset(
+        image_dir='../Dataset_segmentation/Val/Images',
+        mask_dir='../Dataset_segmentation/Val/Masks',
+        transform=val_transform
+    )
+
+train_loader = make_loader(train_dataset, batch_size=8, shuffle=True)
+val_loader = make_loader(val_dataset, batch_size=8, shuffle=False)
\ No newline at end of file
@@ -2,7 +2,7 @@ import torch
 import torch.optim as optim
 from torch.utils.tensorboard import SummaryWriter
 from unet_model import UNet
-from segmentation_dataset_preprocessing import train_loader, val_loader
+from segmentation_dataset_preprocessing import train_loader, val_loader, augment_batch
 from loss_functions import DiceBCELoss, dice_coefficient
 import matplotlib.pyplot as plt
 import numpy as np
@@ -29,8 +29,10 @@ for epoch in range(num_epochs):
     running_loss = 0.0
     
     for images, masks in train_loader:
-        images = images.to(device)
-        masks = masks.to(device)
+        images = images.to(device, non_blocking=True)
+        masks = masks.to(device, non_blocking=True)
+        if augment_batch is not None:
+            images, masks = augment_batch(images, masks)
         
         # Forward pass
         outputs = model(images)
@@ -48,8 +50,8 @@ for epoch in range(num_epochs):
     val_dice = 0.0
     with torch.no_grad():
         for images, masks in val_loader:
-            images = images.to(device)
-            masks = masks.to(device)
+            images = images.to(device, non_blocking=True)
+            masks = masks.to(device, non_blocking=True)
             
             outputs = model(images)
             val_dice += dice_coefficient(outputs, masks).item()
@@ -34,12 +34,14 @@ class Up(nn.Module):
     """Upscaling then double conv"""
     def __init__(self, in_channels, out_channels, bilinear=True):
         super().__init__()
+        # the skip connection adds out_channels; bilinear upsampling keeps
+        # in_channels, the transposed conv halves them
         if bilinear:
             self.up = nn.Upsample(scale_factor=2, mode='bilinear', align_corners=True)
+            self.conv = DoubleConv(in_channels + out_channels, out_channels)
         else:
-            self.up = nn.ConvTranspose2d(in_channels // 2, in_channels // 2, kernel_size=2, stride=2)
-        
-        self.conv = DoubleConv(in_channels, out_channels)
+            self.up = nn.ConvTranspose2d(in_channels, in_channels // 2, kernel_size=2, stride=2)
+            self.conv = DoubleConv(in_channels // 2 + out_channels, out_channels)
 
     def forward(self, x1, x2):
         x1 = self.up(x1)